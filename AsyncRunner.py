@@ -0,0 +1,263 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from Script import DriverPool, execute_query
+from Downloads import DownloadStore, prepare_staging_dir
+from Manifest import Manifest
+from Tracing import TraceSummary
+from Failures import RetryPolicy, FailureReport, classify, TRANSIENT
+from Downloads import query_fingerprint
+from Scheduler import CostModel, order_by_cost, predict_makespan
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        """
+        Limits how often new portal sessions are started.
+
+        Args:
+            rate (float): Tokens added per second
+            capacity (int): Maximum burst of sessions started back to back
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Waits until a token is available and takes it.
+        """
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AsyncRunner:
+    def __init__(self, num_threads: int = 3, rate: float = 0.5, burst: int = 3,
+                 query_timeout: float = 900, deadline: float = None,
+                 postprocess: Callable = None, max_tasks_per_browser: int = 25,
+                 backend: str = 'selenium', browser_profile: str = 'debug', trace_dir: str = None,
+                 max_attempts: int = 3, capture: bool = False):
+        """
+        Schedules queries on an event loop and runs the blocking browser work in a bounded thread pool.
+
+        Args:
+            num_threads (int): Maximum number of queries running at once
+            rate (float): Portal sessions started per second, averaged
+            burst (int): Sessions that may start back to back before the rate applies
+            query_timeout (float): Seconds a single query may take before it is cancelled
+            deadline (float, optional): Seconds the whole run may take, remaining queries are cancelled after it
+            postprocess (Callable, optional): Called with (query, path) for every stored report as it
+                arrives. Coroutine functions are awaited, plain functions run in the default executor.
+            max_tasks_per_browser (int): Queries a browser serves before it is recycled
+            backend (str): 'selenium' or 'http', as in run_queries
+            browser_profile (str): Name of the BROWSER_PROFILES entry browsers are launched with
+            trace_dir (str, optional): Directory for per-query Chrome trace files and summary.json
+            max_attempts (int): Attempts per query when failures are transient
+            capture (bool): Take reports off Chrome's network events instead of its downloads
+        """
+        self.num_threads = num_threads
+        self.bucket_args = (rate, burst)
+        self.query_timeout = query_timeout
+        self.deadline = deadline
+        self.postprocess = postprocess
+        self.backend = backend
+        self.summary = TraceSummary(trace_dir)
+        self.retry = RetryPolicy(max_attempts=max_attempts)
+        self.failures = FailureReport()
+        self.pool = DriverPool(max_tasks=max_tasks_per_browser, profile=browser_profile, capture=capture)
+        self.running = {}  # query index -> executor thread name
+        self.prepared = set()
+        self.lock = threading.Lock()
+        # Queries by final outcome, they add up to the queries run, plus timed out attempts
+        self.results = {'done': 0, 'failed': 0, 'timed_out': 0, 'cancelled': 0, 'timeouts': 0}
+
+    def _run_blocking(self, index, options, download_dir, store, manifest, session):
+        """
+        Runs one query on an executor thread, using that thread's warm browser.
+        """
+        worker = threading.current_thread().name
+        staging_dir = os.path.join(download_dir, 'staging', worker)
+        with self.lock:
+            self.running[index] = worker
+            if worker not in self.prepared:
+                prepare_staging_dir(staging_dir)
+                self.prepared.add(worker)
+        try:
+            return execute_query(options, worker, staging_dir, self.pool, store, manifest, session,
+                                 self.summary)
+        finally:
+            with self.lock:
+                self.running.pop(index, None)
+
+    def _abort(self, index):
+        """
+        Quits the browser of a query that timed out so its blocked thread returns.
+
+        Chrome can take seconds to shut down, so it is quit on the default executor rather
+        than on the event loop, which keeps serving the other queries meanwhile.
+
+        Returns:
+            asyncio.Future: Resolves once the browser has quit, or None when the query holds no browser.
+        """
+        with self.lock:
+            worker = self.running.get(index)
+        if worker:
+            return asyncio.get_running_loop().run_in_executor(None, self.pool.discard, worker)
+        return None
+
+    async def _run_query(self, index, options, slots, bucket, executor, download_dir, store,
+                         manifest, session, arrivals):
+        loop = asyncio.get_running_loop()
+        fingerprint = query_fingerprint(options)
+        attempt = 1
+        while True:
+            timed_out = False
+            try:
+                # Waiting for a free thread counts neither against the rate nor the timeout
+                async with slots:
+                    await bucket.acquire()
+                    future = loop.run_in_executor(executor, self._run_blocking, index, options,
+                                                  download_dir, store, manifest, session)
+                    done, _ = await asyncio.wait({future}, timeout=self.query_timeout)
+                    if not done:
+                        print(f"Query {index + 1} timed out after {self.query_timeout}s")
+                        quitting = self._abort(index)
+                        if quitting is not None:
+                            await quitting
+                        # The thread is busy until the quit browser lets it return, keep its slot until then
+                        await asyncio.gather(future, return_exceptions=True)
+                        raise asyncio.TimeoutError()
+                    stored = future.result()
+                if stored:
+                    break
+                kind, error = TRANSIENT, "No file downloaded"
+            except asyncio.TimeoutError:
+                self.results['timeouts'] += 1
+                timed_out = True
+                kind, error = TRANSIENT, f"timed out after {self.query_timeout}s"
+            except asyncio.CancelledError:
+                self._abort(index)
+                self.results['cancelled'] += 1
+                self.failures.record(fingerprint, options, 'failed', attempt, 'cancelled', "deadline reached")
+                raise
+            except Exception as e:
+                kind, error = classify(e), str(e)
+
+            if not self.retry.should_retry(kind, attempt):
+                print(f"Error in query {index + 1}: [{kind}] {error}")
+                # Counted once, by how its last attempt ended
+                self.results['timed_out' if timed_out else 'failed'] += 1
+                self.failures.record(fingerprint, options, 'failed', attempt, kind, error)
+                return
+
+            delay = self.retry.delay(attempt)
+            print(f"Query {index + 1}: {kind} failure ({error}), retry {attempt + 1} in {delay:.0f}s")
+            self.failures.record(fingerprint, options, 'retrying', attempt, kind, error)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+        self.results['done'] += 1
+        self.failures.record(fingerprint, options, 'done', attempt)
+        if self.postprocess:
+            await arrivals.put((options, stored))
+
+    async def _consume(self, arrivals):
+        """
+        Hands each stored report to the post-processing callback as soon as it arrives.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await arrivals.get()
+            try:
+                if item is None:
+                    return
+                if asyncio.iscoroutinefunction(self.postprocess):
+                    await self.postprocess(*item)
+                else:
+                    await loop.run_in_executor(None, self.postprocess, *item)
+            except Exception as e:
+                print(f"Error post-processing {item[1]}: {e}")
+            finally:
+                arrivals.task_done()
+
+    async def run(self, queries: List[Dict], resume_mode: str = 'resume'):
+        """
+        Downloads the queries and returns counts of done, failed, timed out and cancelled queries.
+        """
+        download_dir = os.path.join(os.getcwd(), 'downloads')
+        os.makedirs(download_dir, exist_ok=True)
+        manifest = Manifest(os.path.join(download_dir, 'manifest.jsonl'))
+        queries = manifest.pending(queries, resume_mode)
+        # The executor starts queries in submission order, so submit the longest first
+        model = CostModel(manifest.entries.values())
+        queries = order_by_cost(queries, model)
+        predicted = predict_makespan([model.estimate(q) for q in queries], self.num_threads)
+        start = time.perf_counter()
+        store = DownloadStore(download_dir)
+        session = None
+        if self.backend == 'http':
+            from HttpScript import create_session
+            session = create_session(pool_size=self.num_threads)
+
+        bucket = TokenBucket(*self.bucket_args)
+        # One slot per executor thread, so a query is only submitted when a thread can start it
+        slots = asyncio.Semaphore(self.num_threads)
+        arrivals = asyncio.Queue()
+        consumer = asyncio.create_task(self._consume(arrivals)) if self.postprocess else None
+
+        executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix='portal')
+        tasks = [asyncio.create_task(self._run_query(i, q, slots, bucket, executor, download_dir, store,
+                                                     manifest, session, arrivals))
+                 for i, q in enumerate(queries)]
+        try:
+            pending = set()
+            if tasks:
+                done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+            if pending:
+                print(f"Deadline of {self.deadline}s reached, cancelling {len(pending)} queries")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            if consumer:
+                await arrivals.put(None)
+                await consumer
+        finally:
+            # Quitting the browsers unblocks any thread still waiting on the portal
+            self.pool.close()
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.pool.report()
+            self.summary.report()
+            self.failures.report()
+            if session is not None:
+                session.close()
+
+        print(f"Makespan: predicted {predicted:.0f}s, actual {time.perf_counter() - start:.0f}s")
+        print(f"Async run: {self.results}")
+        return self.results
+
+def run_queries_async(queries: List[Dict], num_threads: int = 3, resume_mode: str = 'resume', **kwargs):
+    """
+    Download multiple reports with the asyncio scheduler, see AsyncRunner for the options.
+
+    Args:
+        queries (List[Dict]): List of queries to process
+        num_threads (int): Maximum number of queries running at once
+        resume_mode (str): 'resume', 'only-failed' or 'force', as in run_queries
+
+    Returns:
+        dict: Counts of done, failed, timed out and cancelled queries, and of timed out
+            attempts under 'timeouts'.
+    """
+    runner = AsyncRunner(num_threads=num_threads, **kwargs)
+    return asyncio.run(runner.run(queries, resume_mode))
@@ -0,0 +1,241 @@
+import os
+import sys
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Dict, List
+
+from Script import Script, BROWSER_PROFILES, load_queries, run_queries
+from MockPortal import MockPortal, MOCK_ADMINISTRATIONS, MOCK_GRADES, synthetic_report_csv
+from Processing import processing
+from Manifest import Manifest
+from Concurrency import children_rss
+from Governor import browser_rss
+
+# Query shapes for the throughput benchmark: (districts, administrations, subjects, grades)
+QUERY_SHAPES = {
+    'small': (1, 1, 1, 1),
+    'medium': (5, 2, 2, 3),
+    'wide': (20, 2, 2, 6)
+}
+
+def benchmark_profiles(queries: List[Dict], profiles=None, repeat: int = 1):
+    """
+    Runs the same queries under each browser profile and compares time and memory.
+
+    Args:
+        queries (List[Dict]): Queries to run for every profile
+        profiles (list[str], optional): BROWSER_PROFILES names, defaults to all of them
+        repeat (int): How many times each query runs per profile
+
+    Returns:
+        dict: Profile name -> {'startup', 'per_query', 'peak_rss', 'failures'}, where failures
+            lists the errors of queries that raised. They are left out of per_query.
+    """
+    profiles = profiles or sorted(BROWSER_PROFILES)
+    results = {}
+
+    for profile in profiles:
+        download_dir = tempfile.mkdtemp(prefix=f"bench_{profile}_")
+        start = time.perf_counter()
+        try:
+            driver = Script.create_driver(download_dir, profile)
+        except Exception as e:
+            print(f"Profile {profile}: browser failed to start: {e}")
+            results[profile] = {'startup': None, 'per_query': 0.0, 'peak_rss': None, 'failures': [str(e)]}
+            continue
+        startup = time.perf_counter() - start
+
+        durations, failures, peak = [], [], browser_rss(driver)
+        try:
+            for _ in range(repeat):
+                for query in queries:
+                    options = dict(query, download_dir=download_dir)
+                    start = time.perf_counter()
+                    try:
+                        Script(options, driver=driver).run()
+                    except Exception as e:
+                        # One broken query must not lose the profiles already measured
+                        print(f"Profile {profile}: query failed: {e}")
+                        failures.append(str(e))
+                        continue
+                    durations.append(time.perf_counter() - start)
+
+                    rss = browser_rss(driver)
+                    if rss is not None:
+                        peak = max(peak or 0, rss)
+        finally:
+            driver.quit()
+
+        results[profile] = {
+            'startup': startup,
+            'per_query': sum(durations) / len(durations) if durations else 0.0,
+            'peak_rss': peak,
+            'failures': failures
+        }
+
+    print("\nProfile    startup   per query   peak RSS   failed")
+    for profile, r in results.items():
+        rss = f"{r['peak_rss']:.0f} MB" if r['peak_rss'] is not None else "n/a"
+        startup = f"{r['startup']:6.1f}s" if r['startup'] is not None else "    n/a"
+        print(f"{profile:<10} {startup}   {r['per_query']:7.1f}s   {rss:>8}   {len(r['failures']):>6}")
+    return results
+
+def shape_queries(shape, count, portal_url):
+    """
+    Builds count distinct queries of one QUERY_SHAPES shape against the mock portal.
+    """
+    districts, administrations, subjects, grades = QUERY_SHAPES[shape]
+    return [{
+        'district': [f'{i:03d}{d:03d}' for d in range(districts)],
+        'program': 'STAAR 3-8',
+        'report': 'Group Summary: Performance Levels & Reporting Categories',
+        'administration': MOCK_ADMINISTRATIONS[:administrations],
+        'subject': ['Mathematics', 'Reading', 'Science', 'Social Studies'][:subjects],
+        'grade': MOCK_GRADES[:grades],
+        'version': '',
+        'cluster': [],
+        'portal_url': portal_url,
+        'download_timeout': 30
+    } for i in range(count)]
+
+def benchmark_throughput(thread_counts=(1, 2, 3), shapes=('small', 'wide'), count: int = 6,
+                         profile: str = 'fast', latency: float = 0.05):
+    """
+    Runs run_queries against the offline mock portal for each thread count and query shape.
+
+    Reports queries per minute, p50/p95 per phase and peak memory of all browsers, so
+    changes to the hot path can be compared without touching the live portal.
+
+    Args:
+        thread_counts (tuple[int]): Worker counts to try
+        shapes (tuple[str]): QUERY_SHAPES names to try
+        count (int): Queries per run
+        profile (str): Browser profile the workers launch with
+        latency (float): Seconds the mock page waits before each UI response
+
+    Returns:
+        list[dict]: One result per (shape, threads) run.
+    """
+    portal = MockPortal(latency=latency).start()
+    results = []
+    cwd = os.getcwd()
+    try:
+        for shape in shapes:
+            for threads in thread_counts:
+                # Every run gets a fresh downloads directory and manifest
+                os.chdir(tempfile.mkdtemp(prefix=f"bench_{shape}_{threads}_"))
+
+                peak = [children_rss()]
+                stop = threading.Event()
+                def sample():
+                    while not stop.wait(0.5):
+                        rss = children_rss()
+                        if rss is not None:
+                            peak[0] = max(peak[0] or 0, rss)
+                sampler = threading.Thread(target=sample, daemon=True)
+                sampler.start()
+
+                queries = shape_queries(shape, count, portal.selections_url)
+                start = time.perf_counter()
+                summary = run_queries(queries, threads, resume_mode='force', browser_profile=profile)
+                elapsed = time.perf_counter() - start
+                stop.set()
+                sampler.join()
+
+                # Idle workers split queries into chunks with their own files, so count queries
+                # the manifest lists as done, a split one once all of its chunks are
+                manifest = Manifest(os.path.join('downloads', 'manifest.jsonl'))
+                downloaded = sum(1 for query in queries if manifest.is_done(query))
+                results.append({
+                    'shape': shape,
+                    'threads': threads,
+                    'queries': count,
+                    'downloaded': downloaded,
+                    'seconds': elapsed,
+                    'queries_per_minute': downloaded / elapsed * 60 if elapsed else 0.0,
+                    'peak_rss': peak[0],
+                    'phases': {k: v for k, v in (summary or {}).items() if k.startswith('phase:')}
+                })
+    finally:
+        os.chdir(cwd)
+        portal.stop()
+
+    print("\nShape    threads  done      time   q/min   peak RSS")
+    for r in results:
+        rss = f"{r['peak_rss']:.0f} MB" if r['peak_rss'] is not None else "n/a"
+        print(f"{r['shape']:<8} {r['threads']:>7}  {r['downloaded']:>2}/{r['queries']:<2} "
+              f"{r['seconds']:7.1f}s {r['queries_per_minute']:7.1f} {rss:>10}")
+        for phase, s in r['phases'].items():
+            print(f"    {phase[len('phase:'):]:<28} p50 {s['p50']:6.2f}s  p95 {s['p95']:6.2f}s")
+    return results
+
+def write_corpus(directory, files, districts=20, categories=40):
+    """
+    Writes files synthetic Group Summary exports into directory, as if downloaded.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for i in range(files):
+        organizations = [f'{i:03d}{d:03d}' for d in range(districts)]
+        body = synthetic_report_csv(organizations, MOCK_ADMINISTRATIONS[:2], MOCK_GRADES, seed=i,
+                                    categories=categories)
+        with open(os.path.join(directory, f'report_{i:04d}.csv'), 'w', encoding='utf-8', newline='') as file:
+            file.write(body)
+
+def benchmark_processing(files: int = 200, worker_counts=(1, 2, 4)):
+    """
+    Runs processing() serially and with process pools over one synthetic corpus.
+
+    Every run starts without a cache, and the combined outputs of each run are hashed to
+    check they are byte-identical to the serial run.
+
+    Args:
+        files (int): Number of generated reports
+        worker_counts (tuple[int]): Worker counts to compare, 1 is the serial run
+
+    Returns:
+        list[dict]: One result per worker count.
+    """
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="bench_processing_"))
+    results = []
+    try:
+        write_corpus('downloads', files)
+        for workers in worker_counts:
+            start = time.perf_counter()
+            processing(use_cache=False, workers=workers)
+            elapsed = time.perf_counter() - start
+
+            digest = hashlib.sha256()
+            for name in ('combined_math.csv', 'combined_reading.csv'):
+                with open(os.path.join('downloads', 'clean', name), 'rb') as file:
+                    digest.update(file.read())
+            results.append({'workers': workers, 'seconds': elapsed, 'output': digest.hexdigest()})
+    finally:
+        os.chdir(cwd)
+
+    serial = results[0]
+    print(f"\nProcessing {files} reports\nworkers      time   speedup   identical")
+    for r in results:
+        speedup = serial['seconds'] / r['seconds'] if r['seconds'] else 0.0
+        print(f"{r['workers']:>7} {r['seconds']:8.2f}s {speedup:8.2f}x   {r['output'] == serial['output']}")
+    return results
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'profiles'
+    if command == 'profiles':
+        # A single query keeps the comparison short, pass a count to use more rows of my3.csv
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+        benchmark_profiles(load_queries()[:count])
+    elif command == 'throughput':
+        # Offline run against MockPortal, pass the thread counts to try, e.g. 1 2 4
+        threads = tuple(int(t) for t in sys.argv[2:]) or (1, 2, 3)
+        benchmark_throughput(thread_counts=threads)
+    elif command == 'processing':
+        # Offline run over generated reports, pass the number of files and worker counts, e.g. 300 1 4
+        files = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        workers = tuple(int(w) for w in sys.argv[3:]) or (1, 2, 4)
+        benchmark_processing(files, workers)
+    else:
+        print(f"Unknown benchmark '{command}'")
@@ -0,0 +1,146 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+
+# Bump when process_report changes what it returns, so old entries are not reused
+CACHE_VERSION = 1
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Returns the sha256 hex digest of a file's content.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ProcessingCache:
+    def __init__(self, directory: str):
+        """
+        Per-report cache of the frames process_report returns, pickled next to a JSON index.
+
+        An entry is reused while its raw file keeps the same size and mtime. When those
+        change, the content hash decides, so a file that was only touched or copied is
+        not parsed again.
+
+        Args:
+            directory (str): Directory holding index.json and the pickled frames
+        """
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.index = self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, mode='r', encoding='utf-8') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if index.get('version') != CACHE_VERSION:
+            return {}
+        return index.get('entries', {})
+
+    def save(self):
+        """
+        Writes the index, call once after a batch of lookups and stores.
+        """
+        tmp = self.index_path + '.part'
+        with self.lock:
+            with open(tmp, mode='w', encoding='utf-8') as file:
+                json.dump({'version': CACHE_VERSION, 'entries': self.index}, file)
+        os.replace(tmp, self.index_path)
+
+    def _frames_path(self, entry):
+        return os.path.join(self.directory, f"{entry['sha256']}.pkl")
+
+    def get(self, path):
+        """
+        Returns the cached result for a raw report, or raises KeyError when it must be processed.
+
+        Args:
+            path (str): Path of the raw report
+
+        Returns:
+            tuple or None: The (math_df, reading_df) process_report returned, None when it
+                rejected the report.
+        """
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.index.get(key)
+        if entry is None:
+            self._miss(path)
+
+        if (entry['size'], entry['mtime']) != (stat.st_size, stat.st_mtime_ns):
+            if entry['size'] != stat.st_size or entry['sha256'] != file_hash(path):
+                self._miss(path)
+            # Same content under a new mtime
+            with self.lock:
+                entry['mtime'] = stat.st_mtime_ns
+
+        try:
+            with open(self._frames_path(entry), 'rb') as file:
+                result = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self._miss(path)
+        with self.lock:
+            self.hits += 1
+        return result
+
+    def _miss(self, path):
+        # Workers look reports up concurrently, the counters are only updated under the lock
+        with self.lock:
+            self.misses += 1
+        raise KeyError(path)
+
+    def put(self, path, result):
+        """
+        Caches the result of processing a raw report.
+
+        Args:
+            path (str): Path of the raw report
+            result (tuple or None): What process_report returned for it
+        """
+        stat = os.stat(path)
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': file_hash(path)}
+        frames_path = self._frames_path(entry)
+        tmp = frames_path + '.part'
+        with open(tmp, 'wb') as file:
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, frames_path)
+        with self.lock:
+            self.index[os.path.abspath(path)] = entry
+
+    def evict(self, paths):
+        """
+        Drops entries whose raw file is no longer among paths, and their pickles.
+
+        Args:
+            paths (iterable[str]): The raw reports that still exist
+        """
+        keep = {os.path.abspath(p) for p in paths}
+        with self.lock:
+            stale = [key for key in self.index if key not in keep]
+            removed = [self.index.pop(key) for key in stale]
+            in_use = {entry['sha256'] for entry in self.index.values()}
+        for entry in removed:
+            if entry['sha256'] not in in_use:
+                try:
+                    os.remove(self._frames_path(entry))
+                except OSError:
+                    pass
+        if removed:
+            print(f"Cache: evicted {len(removed)} entries for reports that no longer exist")
+
+    def report(self):
+        """
+        Prints how many reports were loaded from the cache.
+        """
+        print(f"Cache: {self.hits} reports loaded from cache, {self.misses} processed")
@@ -0,0 +1,317 @@
+import io
+import re
+import json
+import time
+import base64
+import urllib.request
+
+from Downloads import query_fingerprint
+
+try:
+    import websocket  # websocket-client, installed along with selenium
+except ImportError:
+    websocket = None  # Reports are read off the network log, replayed when Chrome kept no body
+
+# Requests whose response is the report, matched against the URL
+EXPORT_PATTERN = re.compile(r'/export(\?|$)|/reports/export')
+
+# Requests the interceptor pauses at the response stage, narrowed down with EXPORT_PATTERN
+EXPORT_URL_GLOB = '*export*'
+
+# Headers fetch() may not set, the browser fills them in itself
+FORBIDDEN_HEADERS = re.compile(r'^(:|sec-|proxy-)|^(accept-charset|accept-encoding|access-control-request-headers|'
+                               r'access-control-request-method|connection|content-length|cookie|cookie2|date|dnt|'
+                               r'expect|host|keep-alive|origin|referer|te|trailer|transfer-encoding|upgrade|via)$',
+                               re.IGNORECASE)
+
+# Replays a request inside the page with the portal's cookies, resolving to base64 or an error
+REPLAY_SCRIPT = """
+const [url, method, headers, body, done] = arguments;
+fetch(url, {method, headers, body: body || undefined, credentials: 'include'})
+  .then(r => r.ok ? r.arrayBuffer() : Promise.reject(new Error('HTTP ' + r.status)))
+  .then(buf => {
+    let bin = '';
+    const bytes = new Uint8Array(buf);
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+      bin += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    }
+    done({data: btoa(bin)});
+  })
+  .catch(e => done({error: String(e)}));
+"""
+
+class CapturedReport:
+    def __init__(self, query, data: bytes, url: str = None):
+        """
+        A report held in memory, tagged with the query that produced it.
+
+        Args:
+            query (dict): The query
+            data (bytes): The report file as sent by the portal
+            url (str, optional): The export request it was taken from
+        """
+        self.query = query
+        self.data = data
+        self.url = url
+        self.fingerprint = query_fingerprint(query)
+
+    def buffer(self):
+        """
+        Returns the report as a file-like object, e.g. for pd.read_csv.
+        """
+        return io.BytesIO(self.data)
+
+def debugger_url(driver):
+    """
+    Returns the DevTools websocket URL of the driver's current tab, or None when Chrome exposes none.
+    """
+    address = (driver.capabilities.get('goog:chromeOptions') or {}).get('debuggerAddress')
+    if not address:
+        return None
+    with urllib.request.urlopen(f"http://{address}/json", timeout=5) as response:
+        pages = [target for target in json.load(response) if target.get('type') == 'page']
+    # ChromeDriver's window handles are the DevTools target ids
+    handle = driver.current_window_handle.upper()
+    for target in pages:
+        if target.get('id') and handle.endswith(target['id'].upper()):
+            return target.get('webSocketDebuggerUrl')
+    return pages[0].get('webSocketDebuggerUrl') if pages else None
+
+class ExportInterceptor:
+    def __init__(self, url: str, timeout: float = 10):
+        """
+        A DevTools session of its own on the tab, pausing export responses before Chrome
+        hands them to its download manager so their body can still be read.
+
+        Args:
+            url (str): The tab's DevTools websocket URL, see debugger_url
+            timeout (float): Seconds to wait for the answer to a command
+        """
+        self.timeout = timeout
+        self.ws = websocket.create_connection(url, timeout=timeout, suppress_origin=True)
+        self.next_id = 0
+        self.events = []
+
+    def call(self, method, params=None):
+        """
+        Sends a DevTools command and returns its result, queueing the events that arrive meanwhile.
+        """
+        self.next_id += 1
+        self.ws.send(json.dumps({'id': self.next_id, 'method': method, 'params': params or {}}))
+        while True:
+            message = json.loads(self.ws.recv())
+            if message.get('id') == self.next_id:
+                if 'error' in message:
+                    raise RuntimeError(f"{method}: {message['error'].get('message')}")
+                return message.get('result', {})
+            if 'method' in message:
+                self.events.append(message)
+
+    def enable(self):
+        self.call('Fetch.enable', {'patterns': [{'urlPattern': EXPORT_URL_GLOB, 'requestStage': 'Response'}]})
+
+    def close(self):
+        try:
+            self.call('Fetch.disable')
+        except Exception:
+            pass  # Chrome drops the interception along with the session
+        finally:
+            self.ws.close()
+
+    def poll(self, timeout: float):
+        """
+        Waits up to timeout for DevTools events and resumes every paused request.
+
+        Returns:
+            list: (network request id, url, bytes) of each export response read.
+        """
+        if not self.events:
+            self.ws.settimeout(timeout)
+            try:
+                message = json.loads(self.ws.recv())
+                if 'method' in message:
+                    self.events.append(message)
+            except websocket.WebSocketTimeoutException:
+                pass
+            finally:
+                self.ws.settimeout(self.timeout)
+
+        captured = []
+        while self.events:
+            event = self.events.pop(0)
+            if event.get('method') == 'Fetch.requestPaused':
+                report = self._resume(event.get('params', {}))
+                if report:
+                    captured.append(report)
+        return captured
+
+    def _resume(self, params):
+        request_id = params['requestId']
+        url = params.get('request', {}).get('url', '')
+        status = params.get('responseStatusCode', 0)
+        headers = params.get('responseHeaders', [])
+        disposition = next((h['value'] for h in headers if h['name'].lower() == 'content-disposition'), '')
+        if not (200 <= status < 300 and (EXPORT_PATTERN.search(url) or 'attachment' in disposition)):
+            self.call('Fetch.continueRequest', {'requestId': request_id})
+            return None
+
+        try:
+            result = self.call('Fetch.getResponseBody', {'requestId': request_id})
+        except RuntimeError as e:
+            print(f"Could not read the export response at {url}: {e}")
+            self.call('Fetch.continueRequest', {'requestId': request_id})
+            return None
+        body = result['body']
+        if not result.get('base64Encoded'):
+            body = base64.b64encode(body.encode('utf-8')).decode('ascii')
+        # The response goes on unchanged so the page finishes the submit, the download stays denied
+        self.call('Fetch.fulfillRequest', {'requestId': request_id, 'responseCode': status,
+                                           'responseHeaders': headers, 'body': body})
+        return params.get('networkId', request_id), url, base64.b64decode(body)
+
+class ResponseCapture:
+    def __init__(self, driver, poll_interval: float = 0.2):
+        """
+        Takes the export response off the Chrome DevTools network events instead of the disk.
+
+        The driver must be launched with performance logging, see Script.create_driver(capture=True).
+        While capturing, Chrome's own download is denied so nothing is written to disk. The export
+        response is paused at the response stage and read through an ExportInterceptor, the request
+        is only replayed in the page when that session could not be opened or missed the response.
+
+        Args:
+            driver (WebDriver): The driver that submits the export
+            poll_interval (float): Seconds between reads of the performance log
+        """
+        self.driver = driver
+        self.poll_interval = poll_interval
+        self.interceptor = None
+
+    def start(self):
+        """
+        Drops earlier network events, stops Chrome from saving the next download and starts
+        pausing export responses.
+        """
+        self.driver.get_log('performance')
+        self.driver.execute_cdp_cmd('Browser.setDownloadBehavior', {'behavior': 'deny'})
+        self.interceptor = self._intercept()
+
+    def stop(self, download_dir):
+        """
+        Stops intercepting and lets the browser download into download_dir again.
+        """
+        self._release()
+        self.driver.execute_cdp_cmd('Browser.setDownloadBehavior',
+                                    {'behavior': 'allow', 'downloadPath': download_dir})
+
+    def _intercept(self):
+        if websocket is None:
+            return None
+        try:
+            url = debugger_url(self.driver)
+            if url is None:
+                return None
+            interceptor = ExportInterceptor(url)
+            interceptor.enable()
+            return interceptor
+        except Exception as e:
+            print(f"Could not intercept export responses, reading the network log only: {e}")
+            return None
+
+    def _release(self):
+        if self.interceptor:
+            self.interceptor.close()
+            self.interceptor = None
+
+    def _events(self):
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            yield message.get('method'), message.get('params', {})
+
+    def _body(self, request_id, request, timeout):
+        """
+        Reads a response body from Chrome, replaying the request in the page when Chrome
+        handed the response to its download manager and kept no body.
+
+        Args:
+            request_id (str): Network request id of the export
+            request (dict): The request as sent, from Network.requestWillBeSent
+            timeout (float): Seconds the replay may take
+        """
+        try:
+            result = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            body = result['body']
+            return base64.b64decode(body) if result.get('base64Encoded') else body.encode('utf-8')
+        except Exception:
+            pass
+
+        # The form POST needs its own Content-Type, or the portal answers with an error page
+        headers = {name: value for name, value in request.get('headers', {}).items()
+                   if not FORBIDDEN_HEADERS.match(name)}
+        body = request.get('postData')
+        if body is None and request.get('hasPostData'):
+            # Chrome leaves large bodies out of the event, they are fetched on demand
+            body = self.driver.execute_cdp_cmd('Network.getRequestPostData',
+                                               {'requestId': request_id}).get('postData')
+        previous = self.driver.timeouts.script
+        self.driver.set_script_timeout(timeout)
+        try:
+            result = self.driver.execute_async_script(REPLAY_SCRIPT, request['url'], request.get('method', 'GET'),
+                                                      headers, body)
+        finally:
+            self.driver.set_script_timeout(previous)
+        if not result or 'data' not in result:
+            raise RuntimeError(f"replaying {request['url']}: {(result or {}).get('error')}")
+        return base64.b64decode(result['data'])
+
+    def wait(self, query, timeout: float = 120):
+        """
+        Waits for the export response and returns its body.
+
+        Args:
+            query (dict): The query being downloaded, attached to the result
+            timeout (float): Seconds to wait for the response to finish
+
+        Returns:
+            CapturedReport: The report, or None if no export response arrived in time.
+        """
+        deadline = time.monotonic() + timeout
+        requests = {}  # request id -> request, for every request sent since start()
+        export_id = None
+        captured = None  # (url, bytes) read by the interceptor
+        while time.monotonic() < deadline:
+            if self.interceptor:
+                try:
+                    for export_id, url, data in self.interceptor.poll(self.poll_interval):
+                        captured = (url, data)
+                except Exception as e:
+                    print(f"Lost the interception session, reading the network log only: {e}")
+                    self._release()
+            else:
+                time.sleep(self.poll_interval)
+            for method, params in self._events():
+                request_id = params.get('requestId')
+                if method == 'Network.requestWillBeSent':
+                    requests[request_id] = params.get('request', {})
+                elif method == 'Network.responseReceived':
+                    response = params.get('response', {})
+                    headers = {k.lower(): v for k, v in response.get('headers', {}).items()}
+                    if (EXPORT_PATTERN.search(response.get('url', ''))
+                            or 'attachment' in headers.get('content-disposition', '')):
+                        export_id = request_id
+                        requests.setdefault(request_id, {'url': response.get('url')})
+                elif method in ('Network.loadingFinished', 'Network.loadingFailed') and request_id == export_id:
+                    # Returning only once the denied download has ended, so stop() cannot let it through
+                    if captured:
+                        return CapturedReport(query, captured[1], captured[0])
+                    # The interceptor missed it, a denied download ends as loadingFailed with no body
+                    data = self._body(export_id, requests[export_id], max(deadline - time.monotonic(), 10))
+                    return CapturedReport(query, data, requests[export_id].get('url'))
+
+        if captured:
+            return CapturedReport(query, captured[1], captured[0])
+        print(f"Timed out after {timeout}s waiting for the export response")
+        return None
@@ -0,0 +1,144 @@
+import re
+from typing import Dict, List
+
+# Bump when the portal adds or renames programs, reports or options
+CATALOG_VERSION = "2024.1"
+
+# Map of programs to their corresponding reports and required parameters
+PROGRAMS = {
+    "STAAR 3-8": {
+        "Standard Constructed Response Summary": ['administration', 'grade', 'version'],
+        "Standard Combined Summary": ['administration', 'subject', 'grade'],
+        "Group Summary: Performance Levels & Reporting Categories": ['administration', 'subject', 'grade'],
+        "Standard Summary": ['administration', 'subject', 'version', 'grade'],
+        "Item Analysis Summary": ['administration', 'grade', 'subject', 'version'],
+        "Score Codes Summary": ['administration', 'grade', 'subject']
+    },
+    "STAAR 3-8 Alternate 2 3-8": {
+        'Group Summary': ['administration', 'grade', 'subject'],
+        'Score Codes Summary': ['administration', 'grade', 'subject'],
+        'Standard Summary': ['administration', 'grade', 'subject'],
+    },
+    'STAAR Alternate 2 EOC': {
+        'Group Summary: Performance Levels': ['administration', 'subject'],
+        'Score Codes Summary': ['administration', 'subject'],
+        'Standard Summary': ['administration', 'subject']
+    },
+    'STAAR Cumulative': {
+        'Standard Cumulative Summary': ['administration', 'grade', 'subject']
+    },
+    'STAAR EOC': {
+        'Group Summary: Performance Levels & Reporting Categories': ['administration', 'subject'],
+        'Standard Combined Summary': ['administration', 'subject'],
+        'Item Analysis Summary': ['administration', 'subject'],
+        'Score Codes Summary': ['administration', 'subject'],
+        'Standard Constructed Response Summary': ['administration', 'subject', 'version'],
+        'Standard Summary': ['administration', 'subject', 'version']
+    },
+    'TELPAS': {
+        'Cluster Summary': ['administration', 'subject', 'cluster'],
+        'Standard Summary For Grade': ['administration', 'grade'],
+        'Group Summary: Performance Levels': ['administration', 'subject', 'grade'],
+        'Score Codes Summary': ['administration', 'grade', 'subject'],
+        'Standard Summary For Cluster': ['administration', 'cluster']
+    },
+    'TELPAS Alternate': {
+        'Group Summary: Performance Levels': ['administration', 'subject', 'grade'],
+        'Score Codes Summary': ['administration', 'grade'],
+        'Standard Summary': ['administration', 'grade']
+    }
+}
+
+# Old spellings still accepted in query files, mapped to the catalog name
+REPORT_ALIASES = {
+    'Standard Cummulative Summary': 'Standard Cumulative Summary'
+}
+
+# Patterns each parameter value must match, values outside them are flagged but still run
+ALLOWED_VALUES = {
+    'administration': re.compile(r'^(Spring|Summer|Fall|December|March|April|May|June|July) \d{4}$'),
+    'grade': re.compile(r'^Grade (K|[1-9]|1[0-2])$'),
+    'subject': re.compile(r'^(Mathematics|Reading|Writing|Science|Social Studies|Algebra I|Biology|'
+                          r'English I|English II|U\.S\. History|Listening|Speaking|Composite)$'),
+    'version': re.compile(r'^(STAAR|STAAR Alternate 2|STAAR Spanish|.+ Version)$'),
+    'cluster': re.compile(r'^.+$')
+}
+
+def normalize_query(query):
+    """
+    Replaces an aliased report name with its catalog spelling, in place.
+    """
+    query['report'] = REPORT_ALIASES.get(query.get('report'), query.get('report'))
+    return query
+
+def check_query(query):
+    """
+    Checks one query against the catalog.
+
+    Args:
+        query (dict): The query as returned by load_queries
+
+    Returns:
+        list[tuple]: (severity, message) for every problem, severity is 'error' or 'warning'.
+    """
+    problems = []
+    if not [d for d in query.get('district', []) if d.strip()]:
+        problems.append(('error', "no districts"))
+
+    program, report = query.get('program'), query.get('report')
+    if program not in PROGRAMS:
+        problems.append(('error', f"unknown program '{program}'"))
+        return problems
+    if report in REPORT_ALIASES:
+        problems.append(('warning', f"report '{report}' is spelled '{REPORT_ALIASES[report]}' in the catalog"))
+        report = REPORT_ALIASES[report]
+    if report not in PROGRAMS[program]:
+        problems.append(('error', f"unknown report '{report}' for program '{program}'"))
+        return problems
+
+    for param in PROGRAMS[program][report]:
+        value = query.get(param)
+        values = value if isinstance(value, list) else [value]
+        values = [v for v in values if v]
+        if not values:
+            problems.append(('error', f"missing required parameter '{param}'"))
+            continue
+        pattern = ALLOWED_VALUES.get(param)
+        for v in values:
+            if pattern and not pattern.match(v):
+                problems.append(('warning', f"{param} '{v}' is not a known value"))
+    return problems
+
+def source_lines(query):
+    """
+    Names the CSV lines a query came from, e.g. 'line 4', or 'lines 4, 9' for rows the planner merged.
+    """
+    lines = query.get('lines') or [query.get('line', '?')]
+    return f"line {lines[0]}" if len(lines) == 1 else f"lines {', '.join(str(line) for line in lines)}"
+
+def validate_queries(queries: List[Dict], strict: bool = False):
+    """
+    Checks every query before any browser starts and drops the ones that cannot succeed.
+
+    Args:
+        queries (List[Dict]): Queries as returned by load_queries, each with its CSV 'line'
+        strict (bool): Also drop queries that only have warnings
+
+    Returns:
+        List[Dict]: The queries that passed, with report names normalized.
+    """
+    valid = []
+    rejected = 0
+    for query in queries:
+        problems = check_query(query)
+        for severity, message in problems:
+            print(f"{source_lines(query).capitalize()}: {severity}: {message}")
+
+        if any(s == 'error' for s, _ in problems) or (strict and problems):
+            rejected += 1
+            continue
+        valid.append(normalize_query(query))
+
+    print(f"Validated {len(queries)} queries against catalog {CATALOG_VERSION}: "
+          f"{len(valid)} accepted, {rejected} rejected")
+    return valid
@@ -0,0 +1,214 @@
+import os
+import time
+import threading
+from typing import Callable
+
+try:
+    import psutil
+except ImportError:
+    psutil = None  # Memory is not watched without psutil, load falls back to os.getloadavg
+
+# Rough resident memory of one Chrome session on the selections page, used to size max_workers
+BROWSER_MB = 500
+
+def children_rss():
+    """
+    Returns the resident memory in MB of every process started by this one, i.e. all browsers.
+    """
+    if psutil is None:
+        return None
+    total = 0
+    for process in psutil.Process().children(recursive=True):
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+def available_mb():
+    """
+    Returns the memory in MB the host can still hand out, or None without psutil.
+    """
+    if psutil is None:
+        return None
+    return psutil.virtual_memory().available / (1024 * 1024)
+
+def cpu_load():
+    """
+    Returns the 1-minute load average per core, or None where the platform has none.
+    """
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        if psutil is None:
+            return None
+        return psutil.cpu_percent() / 100
+
+def default_max_workers():
+    """
+    Upper bound on workers for this host: half the cores, limited by free memory per browser.
+    """
+    limit = max(1, (os.cpu_count() or 2) // 2)
+    free = available_mb()
+    if free is not None:
+        limit = min(limit, max(1, int(free // BROWSER_MB)))
+    return limit
+
+class ConcurrencyController:
+    def __init__(self, initial: int, min_workers: int = 1, max_workers: int = None, interval: float = 30,
+                 min_free_mb: float = 1024, max_load: float = 0.9, max_error_rate: float = 0.25,
+                 latency_factor: float = 1.5, summary=None, on_change: Callable = None):
+        """
+        Ramps the number of active workers between min_workers and max_workers.
+
+        Every interval seconds it adds a worker while the host has memory and CPU to spare,
+        drops one when free memory, load or page latency cross their limits, and halves the
+        workers when too many queries fail. Workers above the current target park until
+        they are needed again.
+
+        Args:
+            initial (int): Workers active at the start
+            min_workers (int): Fewest active workers
+            max_workers (int, optional): Most active workers, defaults to default_max_workers()
+            interval (float): Seconds between adjustments
+            min_free_mb (float): Free host memory below which workers are removed
+            max_load (float): Load average per core above which workers are removed
+            max_error_rate (float): Share of failed queries in an interval that halves the workers
+            latency_factor (float): Page wait per query, relative to the best interval seen, above which workers are removed
+            summary (TraceSummary, optional): Source of the page wait times
+            on_change (Callable, optional): Called with the new target after every change
+        """
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers or default_max_workers())
+        self.target = min(self.max_workers, max(self.min_workers, initial))
+        self.interval = interval
+        self.min_free_mb = min_free_mb
+        self.max_load = max_load
+        self.max_error_rate = max_error_rate
+        self.latency_factor = latency_factor
+        self.summary = summary
+        self.on_change = on_change
+
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+        self.completed = 0
+        self.failed = 0
+        self.seen_waits = {}  # "wait:name" -> samples already counted
+        self.best_wait = None
+        self.history = [(0.0, self.target, 'start')]
+        self.start = time.perf_counter()
+        self.thread = threading.Thread(target=self._monitor, name='concurrency', daemon=True)
+
+    def begin(self):
+        """
+        Starts adjusting in the background.
+        """
+        self.thread.start()
+        return self
+
+    def wait_turn(self, index: int, on_park: Callable = None):
+        """
+        Blocks worker number index while it is above the target.
+
+        Args:
+            index (int): Zero-based number of the calling worker
+            on_park (Callable, optional): Called once before blocking, e.g. to quit the worker's browser
+        """
+        with self.condition:
+            if index < self.target:
+                return
+        if on_park:
+            on_park()
+        with self.condition:
+            self.condition.wait_for(lambda: index < self.target)
+
+    def record(self, ok: bool):
+        """
+        Counts a finished query attempt.
+        """
+        with self.condition:
+            self.completed += 1
+            if not ok:
+                self.failed += 1
+
+    def _page_wait(self):
+        """
+        Mean seconds per query spent waiting on the page since the last call, or None.
+        """
+        if self.summary is None:
+            return None
+        total, queries = 0.0, 0
+        with self.summary.lock:
+            for key, values in self.summary.samples.items():
+                if not key.startswith('wait:'):
+                    continue
+                seen = self.seen_waits.get(key, 0)
+                total += sum(values[seen:])
+                queries = max(queries, len(values) - seen)
+                self.seen_waits[key] = len(values)
+        return total / queries if queries else None
+
+    def _decide(self):
+        """
+        Returns the new target and the reason for it.
+        """
+        with self.condition:
+            completed, failed = self.completed, self.failed
+            self.completed = self.failed = 0
+
+        if completed and failed / completed > self.max_error_rate:
+            return max(self.min_workers, self.target // 2), f"{failed}/{completed} queries failed"
+
+        free, load, wait = available_mb(), cpu_load(), self._page_wait()
+        if free is not None and free < self.min_free_mb:
+            return self.target - 1, f"{free:.0f} MB free"
+        if load is not None and load > self.max_load:
+            return self.target - 1, f"load {load:.2f} per core"
+        if wait is not None:
+            if self.best_wait is None or wait < self.best_wait:
+                self.best_wait = wait
+            elif wait > self.best_wait * self.latency_factor:
+                return self.target - 1, f"page waits {wait:.1f}s per query, best {self.best_wait:.1f}s"
+
+        rss = children_rss()
+        if free is not None and rss is not None and self.target:
+            # Only grow when one more browser of the current average size still fits
+            if free - rss / self.target < self.min_free_mb:
+                return self.target, "no memory for another browser"
+        return self.target + 1, "headroom"
+
+    def _monitor(self):
+        while not self.stopped.wait(self.interval):
+            target, reason = self._decide()
+            target = min(self.max_workers, max(self.min_workers, target))
+            if target == self.target:
+                continue
+            with self.condition:
+                self.target = target
+                self.condition.notify_all()
+            elapsed = time.perf_counter() - self.start
+            self.history.append((elapsed, target, reason))
+            print(f"Concurrency: {target} workers at {elapsed:.0f}s ({reason})")
+            if self.on_change:
+                self.on_change(target)
+
+    def stop(self):
+        """
+        Stops adjusting and releases every parked worker so it can shut down.
+        """
+        self.stopped.set()
+        with self.condition:
+            self.target = self.max_workers
+            self.condition.notify_all()
+
+    def report(self):
+        """
+        Prints the chosen concurrency over time.
+
+        Returns:
+            list[tuple]: (seconds since start, workers, reason) for every change.
+        """
+        print(f"\nConcurrency between {self.min_workers} and {self.max_workers} workers:")
+        for elapsed, target, reason in self.history:
+            print(f"  {elapsed:7.0f}s  {target:>3} workers  {reason}")
+        return self.history
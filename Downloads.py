@@ -0,0 +1,182 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import time
+
+# Suffixes Chrome uses for files that are still being written
+PARTIAL_SUFFIXES = ('.crdownload', '.tmp')
+
+# Query fields that identify the report a query produces
+QUERY_FIELDS = ('district', 'program', 'report', 'administration', 'subject', 'grade', 'version', 'cluster')
+
+def query_fingerprint(query):
+    """
+    Returns a stable hash of the parameters that determine a query's report.
+
+    List values are sorted so the same selections always hash the same, whatever
+    order they were listed in.
+
+    Args:
+        query (dict): The query options
+
+    Returns:
+        str: A 16 character hex fingerprint.
+    """
+    canonical = {}
+    for field in QUERY_FIELDS:
+        value = query.get(field, '')
+        if isinstance(value, (list, tuple)):
+            value = sorted(v for v in value if v)
+        canonical[field] = value
+    payload = json.dumps(canonical, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def _normalize(name):
+    """
+    Reduces a file name to lowercase letters and digits so it can be matched after
+    Chrome replaces characters it does not allow in file names.
+    """
+    return re.sub(r'[^0-9a-z]', '', name.lower())
+
+class DownloadWatcher:
+    def __init__(self, directory: str, poll_interval: float = 0.2):
+        """
+        Watches a download directory for the file a query is expected to produce.
+
+        Args:
+            directory (str): Directory Chrome downloads into
+            poll_interval (float): Seconds between directory scans
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+
+    def snapshot(self):
+        """
+        Returns the set of file names currently in the directory.
+        """
+        try:
+            return set(os.listdir(self.directory))
+        except FileNotFoundError:
+            return set()
+
+    def wait_for_download(self, before: set, expected_name: str = None, timeout: float = 120):
+        """
+        Blocks until a new download is complete and returns its path.
+
+        A file counts as complete once it is new since `before`, no `.crdownload`
+        temp file is left for it and its size stayed the same for one poll.
+
+        Args:
+            before (set): Directory snapshot taken before the download was started
+            expected_name (str): Name typed into the download modal, used to match the file to its query
+            timeout (float): Upper bound in seconds to wait for the file
+
+        Returns:
+            str: Path of the finished file, or None if the timeout expired.
+        """
+        expected = _normalize(expected_name) if expected_name else None
+        deadline = time.monotonic() + timeout
+        sizes = {}
+
+        while True:
+            names = self.snapshot()
+            new = [n for n in names - before if not n.endswith(PARTIAL_SUFFIXES)]
+            partial = [n for n in names if n.endswith(PARTIAL_SUFFIXES)]
+
+            for name in sorted(new):
+                # Skip files started by other queries sharing the directory
+                if expected and not _normalize(os.path.splitext(name)[0]).startswith(expected):
+                    continue
+                # Chrome still holds a temp file for this download
+                if any(p.startswith(name) for p in partial):
+                    continue
+
+                path = os.path.join(self.directory, name)
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                if size > 0 and sizes.get(name) == size:
+                    return path
+                sizes[name] = size
+
+            if time.monotonic() >= deadline:
+                print(f"Timed out after {timeout}s waiting for download in {self.directory}")
+                return None
+            time.sleep(self.poll_interval)
+
+def prepare_staging_dir(directory):
+    """
+    Creates a worker's private staging directory and clears files left by an earlier run.
+
+    Args:
+        directory (str): The staging directory
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+class DownloadStore:
+    def __init__(self, directory: str):
+        """
+        Directory of finished reports named by the fingerprint of the query that produced them.
+
+        Args:
+            directory (str): Directory holding the stored reports
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, query, extension='.csv'):
+        """
+        Returns the path a query's report is stored under.
+        """
+        return os.path.join(self.directory, f"{query_fingerprint(query)}{extension}")
+
+    def put(self, path, query):
+        """
+        Moves a finished download from a staging directory into the store.
+
+        The move is an atomic rename when staging and store share a filesystem, so
+        readers never see a half written report.
+
+        Args:
+            path (str): The finished file in a staging directory
+            query (dict): The query that produced it
+
+        Returns:
+            str: The stored path.
+        """
+        target = self.path_for(query, os.path.splitext(path)[1] or '.csv')
+        try:
+            os.replace(path, target)
+        except OSError:
+            # Different filesystem, copy next to the target first and rename into place
+            tmp = target + '.part'
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, target)
+            os.remove(path)
+        return target
+
+    def put_bytes(self, data, query, extension='.csv'):
+        """
+        Writes a report held in memory straight into the store.
+
+        Args:
+            data (bytes): The report file
+            query (dict): The query that produced it
+            extension (str): File extension of the stored report
+
+        Returns:
+            str: The stored path.
+        """
+        target = self.path_for(query, extension)
+        tmp = target + '.part'
+        with open(tmp, 'wb') as file:
+            file.write(data)
+        os.replace(tmp, target)
+        return target
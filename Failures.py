@@ -0,0 +1,99 @@
+import random
+import threading
+from Catalog import source_lines
+from selenium.common.exceptions import (TimeoutException, NoSuchElementException, StaleElementReferenceException,
+                                        ElementClickInterceptedException, WebDriverException)
+
+# Failure kinds
+TRANSIENT = 'transient'              # Slow page, network hiccup, browser crash: worth retrying
+SELECTOR_BROKEN = 'selector_broken'  # The portal's markup changed: retrying will not help
+BAD_INPUT = 'bad_input'              # The query asks for something the portal does not offer
+
+class PhaseError(Exception):
+    def __init__(self, phase, kind, message):
+        """
+        Raised by a Script phase that could not complete.
+
+        Args:
+            phase (str): Name of the phase, e.g. 'select_district'
+            kind (str): TRANSIENT, SELECTOR_BROKEN or BAD_INPUT
+            message (str): What went wrong
+        """
+        super().__init__(f"{phase}: {message}")
+        self.phase = phase
+        self.kind = kind
+
+def classify(error):
+    """
+    Returns the failure kind of an exception raised while running a query.
+    """
+    if isinstance(error, PhaseError):
+        return error.kind
+    if isinstance(error, NoSuchElementException):
+        return SELECTOR_BROKEN
+    if isinstance(error, (TimeoutException, StaleElementReferenceException,
+                          ElementClickInterceptedException, WebDriverException)):
+        return TRANSIENT
+    if isinstance(error, (KeyError, ValueError, TypeError)):
+        return BAD_INPUT
+    # Anything unexpected gets the benefit of the doubt, bounded by the retry limit
+    return TRANSIENT
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 3, base_delay: float = 10, max_delay: float = 300):
+        """
+        Exponential backoff with full jitter for transient failures.
+
+        Args:
+            max_attempts (int): Total attempts per query, including the first
+            base_delay (float): Delay ceiling in seconds after the first failure, doubled after each retry
+            max_delay (float): Upper bound on the delay ceiling
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, kind, attempt):
+        return kind == TRANSIENT and attempt < self.max_attempts
+
+    def delay(self, attempt):
+        """
+        Seconds to wait before the next attempt, after `attempt` failed attempts.
+        """
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+class FailureReport:
+    def __init__(self):
+        """
+        Collects the outcome and attempt count of every query in a run.
+        """
+        self.lock = threading.Lock()
+        self.outcomes = {}  # fingerprint -> (query, status, kind, error, attempts)
+
+    def record(self, fingerprint, query, status, attempts, kind=None, error=None):
+        """
+        Records the latest outcome of a query, status is 'done', 'retrying' or 'failed'.
+        """
+        with self.lock:
+            self.outcomes[fingerprint] = (query, status, kind, error, attempts)
+
+    def report(self):
+        """
+        Prints queries that only succeeded after retries and queries that failed for good.
+
+        Returns:
+            dict: Counts of first-try successes, retried successes and permanent failures.
+        """
+        retried = [o for o in self.outcomes.values() if o[1] == 'done' and o[4] > 1]
+        failed = [o for o in self.outcomes.values() if o[1] != 'done']
+        first_try = len(self.outcomes) - len(retried) - len(failed)
+
+        print(f"\nFailure report: {first_try} succeeded first try, {len(retried)} after retries, "
+              f"{len(failed)} failed permanently")
+        for query, _, _, _, attempts in retried:
+            print(f"  retried ok  {source_lines(query)}: {len(query['district'])} districts "
+                  f"after {attempts} attempts")
+        for query, _, kind, error, attempts in failed:
+            print(f"  FAILED      {source_lines(query)}: [{kind}] {error} ({attempts} attempts)")
+        return {'first_try': first_try, 'retried': len(retried), 'failed': len(failed)}
@@ -0,0 +1,220 @@
+import os
+import time
+import atexit
+import weakref
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None  # Browsers are only recycled by age without psutil
+
+def driver_pid(driver):
+    """
+    Returns the pid of the chromedriver process behind a driver, or None.
+    """
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+
+def process_tree(pid):
+    """
+    Returns the process and all its descendants as psutil.Process objects.
+    """
+    if psutil is None or pid is None:
+        return []
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.Error:
+        return []
+
+def browser_rss(driver):
+    """
+    Returns the resident memory in MB of chromedriver and every Chrome process it started.
+
+    Args:
+        driver (WebDriver): The driver to measure
+
+    Returns:
+        float: RSS in MB, or None when psutil is not installed.
+    """
+    processes = process_tree(driver_pid(driver))
+    if not processes:
+        return None
+
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            continue  # Renderer exited while we were measuring
+    return total / (1024 * 1024)
+
+# Governors alive in this process, reaped by one exit handler
+_GOVERNORS = weakref.WeakSet()
+
+@atexit.register
+def _reap_all():
+    for governor in list(_GOVERNORS):
+        governor.reap()
+
+class BrowserGovernor:
+    def __init__(self, max_rss_mb: float = 1500, max_age: float = 1800):
+        """
+        Tracks the process tree of every pooled browser and decides when one must be restarted.
+
+        A browser is restarted once its chromedriver and Chrome processes together exceed
+        max_rss_mb, or once it has been running for max_age seconds. Processes of a quit
+        browser that are still alive, and any left over at exit, are killed.
+
+        Args:
+            max_rss_mb (float): Memory of one browser's process tree that triggers a restart
+            max_age (float): Seconds after which a browser is restarted
+        """
+        self.max_rss_mb = max_rss_mb
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.browsers = {}  # worker name -> {'pid', 'launched', 'processes'}
+        self.restarts = {'memory': 0, 'age': 0}
+        self.peak_rss = {}  # worker name -> highest RSS seen for any of its browsers
+        self.orphans_killed = 0
+        self.zombies_reaped = 0
+        self.children = set()  # pids of the chromedriver processes this process launched
+        _GOVERNORS.add(self)
+
+    def register(self, worker, driver):
+        """
+        Starts tracking a newly launched browser.
+        """
+        pid = driver_pid(driver)
+        with self.lock:
+            if pid is not None:
+                self.children.add(pid)
+            self.browsers[worker] = {
+                'pid': pid,
+                'launched': time.monotonic(),
+                'processes': {p.pid: p for p in process_tree(pid)}
+            }
+
+    def check(self, worker, driver):
+        """
+        Measures a browser after a query.
+
+        Returns:
+            str: Why the browser should be restarted, or None to keep it.
+        """
+        with self.lock:
+            browser = self.browsers.get(worker)
+        if browser is None:
+            return None
+
+        processes = process_tree(browser['pid'])
+        rss = browser_rss(driver) if processes else None
+        with self.lock:
+            # Renderers come and go, remember every process so leftovers can be found after quit
+            browser['processes'].update((p.pid, p) for p in processes)
+            if rss is not None:
+                self.peak_rss[worker] = max(self.peak_rss.get(worker, 0.0), rss)
+
+        if rss is not None and rss > self.max_rss_mb:
+            with self.lock:
+                self.restarts['memory'] += 1
+            return f"at {rss:.0f} MB"
+        age = time.monotonic() - browser['launched']
+        if age > self.max_age:
+            with self.lock:
+                self.restarts['age'] += 1
+            return f"after {age / 60:.0f} minutes"
+        return None
+
+    def _kill(self, processes):
+        """
+        Terminates the given processes that are still alive, killing those that ignore it.
+
+        psutil checks the creation time before signalling, so a reused pid is never hit.
+        """
+        if psutil is None:
+            return 0
+        alive = []
+        for process in processes:
+            try:
+                if process.is_running() and process.status() != psutil.STATUS_ZOMBIE:
+                    process.terminate()
+                    alive.append(process)
+            except psutil.Error:
+                continue
+        _, still_alive = psutil.wait_procs(alive, timeout=3)
+        for process in still_alive:
+            try:
+                process.kill()
+            except psutil.Error:
+                continue
+        return len(alive)
+
+    def unregister(self, worker):
+        """
+        Stops tracking a browser that was quit and kills whatever it left running.
+        """
+        with self.lock:
+            browser = self.browsers.pop(worker, None)
+        if browser is None:
+            return
+        killed = self._kill(browser['processes'].values())
+        if killed:
+            print(f"{worker}: killed {killed} leftover browser processes")
+            with self.lock:
+                self.orphans_killed += killed
+        self._collect()
+
+    def _collect(self):
+        """
+        Collects the exit status of chromedrivers this process launched that have exited.
+
+        Only those pids are waited on, so exit statuses of other children, e.g. the
+        processing pool's workers, are left to their owners.
+        """
+        if not hasattr(os, 'WNOHANG'):
+            return
+        with self.lock:
+            pids = list(self.children)
+        for pid in pids:
+            try:
+                reaped, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                # Already collected, e.g. by subprocess when the driver was quit
+                reaped = None
+            if reaped == 0:
+                continue
+            with self.lock:
+                self.children.discard(pid)
+                if reaped:
+                    self.zombies_reaped += 1
+
+    def reap(self):
+        """
+        Kills the processes of every browser still tracked and collects exited chromedrivers.
+        """
+        for worker in list(self.browsers):
+            self.unregister(worker)
+        self._collect()
+
+    def report(self):
+        """
+        Prints browser memory and restart counts.
+
+        Returns:
+            dict: Peak RSS per worker, restarts by reason, orphans killed and zombies reaped.
+        """
+        peak = max(self.peak_rss.values()) if self.peak_rss else None
+        rss = f"{peak:.0f} MB" if peak is not None else "n/a"
+        print(f"Browser governor: peak {rss} per browser, {self.restarts['memory']} restarts for memory, "
+              f"{self.restarts['age']} for age, {self.orphans_killed} orphaned processes killed, "
+              f"{self.zombies_reaped} zombies reaped")
+        return {
+            'peak_rss': {worker: round(value, 1) for worker, value in self.peak_rss.items()},
+            'restarts': dict(self.restarts),
+            'orphans_killed': self.orphans_killed,
+            'zombies_reaped': self.zombies_reaped
+        }
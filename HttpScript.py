@@ -0,0 +1,142 @@
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from Downloads import query_fingerprint
+from Tracing import Tracer
+
+# Base of the portal's JSON API, the same calls the selections page makes from the browser
+API_URL = "https://txresearchportal.com/api"
+
+# Endpoint paths relative to API_URL, as recorded from the browser's network panel
+ENDPOINTS = {
+    'search': '/selections/search',  # GET ?query=<name or CDC code> -> [{"id", "name", "cdc"}]
+    'export': '/reports/export'      # POST selections -> report file
+}
+
+# Demographic breakdowns apply_filters ticks in the Selenium backend
+BREAKDOWNS = ['Ethnicity', 'Economically Disadvantaged']
+
+def create_session(pool_size: int = 10, retries: int = 3):
+    """
+    Creates a requests session with keep-alive connection pooling shared by all workers.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections to the portal
+        retries (int): Retries for connection errors and 5xx responses
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5,
+                  status_forcelist=(502, 503, 504), allowed_methods=None)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Accept': 'application/json, text/csv'})
+    return session
+
+class HttpScript:
+    def __init__(self, options, session=None):
+        """
+        Downloads a report by calling the portal's API directly instead of driving Chrome.
+
+        Takes the same options dict as Script.
+
+        Args:
+            options (dict): A dictionary containing configuration options such as download directory, district, program, and report.
+            session (requests.Session, optional): Shared pooled session. A private one is created when omitted.
+        """
+        self.options = options
+        self.api_url = options.get('api_url', API_URL).rstrip('/')
+        self.download_dir = options.get('download_dir', os.path.join(os.getcwd(), 'downloads'))
+        self.download_timeout = options.get('download_timeout', 120)
+        self.session = session if session is not None else create_session()
+        self.downloaded_file = None
+        self.tracer = Tracer(query_fingerprint(options))
+
+    def run(self):
+        """
+        Resolves the districts, requests the export and writes it to the download directory.
+        """
+        start = time.perf_counter()
+        try:
+            with self.tracer.span('resolve_districts'):
+                organizations = self.resolve_districts(self.options['district'])
+            if not organizations:
+                print("No districts could be resolved, skipping export.")
+                return
+            with self.tracer.span('download'):
+                self.downloaded_file = self.download(organizations)
+            print(f"Download complete: {self.downloaded_file} ({time.perf_counter() - start:.1f}s)")
+        except (requests.RequestException, KeyError, ValueError) as e:
+            # A changed API answers with fields or forms this code does not know, the browser takes over
+            print(f"Error downloading report over HTTP: {e}")
+
+    def resolve_districts(self, districts):
+        """
+        Looks up the portal's organization id for each district name or CDC code.
+
+        Args:
+            districts (list[str]): The names or CDC codes of the districts.
+
+        Returns:
+            list: Organization ids, in the order of the districts.
+
+        Raises:
+            ValueError: If a district has no match, so the query is not stored without it.
+        """
+        organizations = []
+        unresolved = []
+        for dis in districts:
+            response = self.session.get(f"{self.api_url}{ENDPOINTS['search']}",
+                                        params={'query': dis}, timeout=30)
+            response.raise_for_status()
+            matches = response.json()
+            if not matches:
+                print(f"No match found for district '{dis}'")
+                unresolved.append(dis)
+                continue
+            # Same choice as the first checkbox in the Selenium results table
+            organizations.append(matches[0]['id'])
+        if unresolved:
+            raise ValueError(f"districts not found over HTTP: {unresolved}")
+        return organizations
+
+    def download(self, organizations):
+        """
+        Requests the CSV export and streams it to disk.
+
+        Args:
+            organizations (list): Organization ids from resolve_districts.
+
+        Returns:
+            str: Path of the written file.
+        """
+        payload = {
+            'organizations': organizations,
+            'program': self.options['program'],
+            'report': self.options['report'],
+            'administrations': self.options.get('administration', []),
+            'subjects': self.options.get('subject', []),
+            'grades': self.options.get('grade', []),
+            'version': self.options.get('version', ''),
+            'clusters': self.options.get('cluster', []),
+            'breakdowns': BREAKDOWNS,
+            'format': 'csv'
+        }
+        os.makedirs(self.download_dir, exist_ok=True)
+        path = os.path.join(self.download_dir, f"{query_fingerprint(self.options)}.csv")
+
+        with self.session.post(f"{self.api_url}{ENDPOINTS['export']}", json=payload,
+                               stream=True, timeout=self.download_timeout) as response:
+            response.raise_for_status()
+            # Write next to the target and rename, so a partial file is never picked up
+            with open(path + '.crdownload', 'wb') as file:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    file.write(chunk)
+        os.replace(path + '.crdownload', path)
+        return path
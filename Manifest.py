@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import threading
+from typing import Dict, List
+
+from Downloads import query_fingerprint
+from Scheduler import query_units
+
+class Manifest:
+    def __init__(self, path: str):
+        """
+        Append-only JSONL record of every query a run started, finished or failed.
+
+        The last line written for a fingerprint is its current state, so a crashed run
+        leaves a usable manifest behind.
+
+        Args:
+            path (str): Location of the manifest file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self):
+        """
+        Reads the manifest and returns the latest entry for each fingerprint.
+        """
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+
+        with open(self.path, mode='r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut off by a crash, the query simply reruns
+                    continue
+                entries[entry['fingerprint']] = entry
+        return entries
+
+    def _append(self, entry):
+        with self.lock:
+            self.entries[entry['fingerprint']] = entry
+            with open(self.path, mode='a', encoding='utf-8') as file:
+                file.write(json.dumps(entry) + '\n')
+                file.flush()
+
+    def start(self, query):
+        """
+        Records that a query was picked up by a worker.
+        """
+        self._append({
+            'fingerprint': query_fingerprint(query),
+            'status': 'running',
+            'started': time.time()
+        })
+
+    def finish(self, query, output=None, error=None):
+        """
+        Records the outcome of a query.
+
+        Args:
+            query (dict): The query that ran
+            output (str, optional): Path of the stored report, None if nothing was downloaded
+            error (str, optional): Why the query failed
+        """
+        fingerprint = query_fingerprint(query)
+        started = self.entries.get(fingerprint, {}).get('started', time.time())
+        finished = time.time()
+        self._append({
+            'fingerprint': fingerprint,
+            'status': 'done' if output and not error else 'failed',
+            'output': output,
+            'error': error,
+            'started': started,
+            'finished': finished,
+            'duration': round(finished - started, 3),
+            'units': query_units(query)
+        })
+
+    def split(self, query, children):
+        """
+        Records that a query was split into district chunks that run as their own queries.
+        """
+        self._append({
+            'fingerprint': query_fingerprint(query),
+            'status': 'split',
+            'children': [query_fingerprint(child) for child in children]
+        })
+
+    def is_done(self, query):
+        """
+        Whether a query finished and its report is still on disk.
+        """
+        return self._is_done(query_fingerprint(query))
+
+    def _is_done(self, fingerprint):
+        entry = self.entries.get(fingerprint)
+        if entry and entry['status'] == 'split':
+            return all(self._is_done(child) for child in entry['children'])
+        return bool(entry and entry['status'] == 'done'
+                    and entry.get('output') and os.path.exists(entry['output']))
+
+    def pending(self, queries: List[Dict], mode: str = 'resume'):
+        """
+        Selects the queries that still need to run.
+
+        Args:
+            queries (List[Dict]): All queries of the run
+            mode (str): 'resume' skips finished queries, 'only-failed' reruns only queries
+                that failed or lost their report, 'force' reruns everything
+
+        Returns:
+            List[Dict]: The queries to enqueue.
+        """
+        if mode == 'force':
+            return list(queries)
+
+        selected = []
+        for query in queries:
+            if self.is_done(query):
+                continue
+            if mode == 'only-failed' and query_fingerprint(query) not in self.entries:
+                continue
+            selected.append(query)
+
+        print(f"Manifest: {len(queries) - len(selected)} of {len(queries)} queries skipped ({mode})")
+        return selected
@@ -0,0 +1,322 @@
+import os
+import csv
+import io
+import sys
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Student groups a Group Summary export breaks down into, Processing keeps the first three
+STUDENT_GROUPS = ['All Students', 'Hispanic/Latino', 'Economically Disadvantaged', 'White', 'Not Economically Disadvantaged']
+
+def synthetic_report_csv(organizations, administrations=None, grades=None, seed=0, categories=0):
+    """
+    Builds a Group Summary style CSV with the columns Processing reads.
+
+    Args:
+        organizations (list[str]): Organization ids or CDC codes, one block of rows each
+        administrations (list[str], optional): Administrations to include
+        grades (list[str], optional): Tested grades to include
+        seed (int): Seed for the generated counts, so the same request returns the same file
+        categories (int): Reporting category columns per subject, real exports have dozens
+
+    Returns:
+        str: The CSV text.
+    """
+    rng = random.Random(seed)
+    administrations = administrations or ['Spring 2021']
+    grades = grades or ['Grade 3']
+    header = ['Organization', 'ID/CDC', 'Administration', 'Tested Grade', 'Student Group']
+    for subject in ('Mathematics', 'Reading'):
+        header += [f'STAAR - {subject}|Tests Taken',
+                   f'STAAR - {subject}|Performance Levels|Approaches and Above|Count',
+                   f'STAAR - {subject}|Performance Levels|Meets and Above|Count',
+                   f'STAAR - {subject}|Performance Levels|Masters|Count']
+        header += [f'STAAR - {subject}|Reporting Category {k}|Average Percent Score'
+                   for k in range(1, categories + 1)]
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(header)
+    for org in organizations:
+        for admin in administrations:
+            for grade in grades:
+                for group in STUDENT_GROUPS:
+                    row = [f'District {org}', org, admin, grade, group]
+                    for _ in range(2):
+                        taken = rng.randint(20, 400)
+                        approaches = rng.randint(0, taken)
+                        meets = rng.randint(0, approaches)
+                        row += [taken, approaches, meets, rng.randint(0, meets)]
+                        row += [rng.randint(0, 100) for _ in range(categories)]
+                    writer.writerow(row)
+    return out.getvalue()
+
+# Options listed on the mock selections page
+MOCK_PROGRAMS = {
+    'STAAR 3-8': ['Group Summary: Performance Levels & Reporting Categories', 'Standard Combined Summary',
+                  'Standard Summary', 'Score Codes Summary'],
+    'STAAR EOC': ['Group Summary: Performance Levels & Reporting Categories', 'Standard Summary'],
+    'TELPAS': ['Cluster Summary', 'Group Summary: Performance Levels']
+}
+MOCK_ADMINISTRATIONS = ['Spring 2021', 'April 2021', 'Spring 2022', 'Spring 2023']
+MOCK_GRADES = [f'Grade {g}' for g in range(3, 9)]
+MOCK_SUBJECTS = ['Mathematics', 'Reading', 'Science', 'Social Studies']
+
+# Single page copy of the portal's selections flow, with the MUI class names and ids Script relies on
+SELECTIONS_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Mock TX Research Portal</title>
+<style>.hidden { display: none; } .MuiDialog-root { border: 1px solid #888; padding: 8px; }</style>
+</head><body>
+<div id="search-area" class="MuiGrid-root MuiGrid-container">
+  <form id="search-form">
+    <input type="text" placeholder="Enter a Campus or District Name or CDC code">
+    <button type="submit" class="MuiButtonBase-root MuiButton-root MuiButton-contained MuiButton-containedInherit MuiButton-sizeMedium MuiButton-containedSizeMedium MuiButton-colorInherit">Search</button>
+  </form>
+  <div id="results"></div>
+  <div id="selected"></div>
+</div>
+<h4>Select the Program</h4>
+<div class="MuiGrid-root MuiGrid-container MuiGrid-spacing-xs-3" id="programs"></div>
+<div class="MuiContainer-root MuiContainer-maxWidthLg" id="parameters">
+  <h4>Select a Report</h4><div id="reports"></div>
+  <h4>Select the Administration</h4><div id="administrations"></div><div id="grades"></div>
+  <h4>Select a Version</h4><div id="versions"></div>
+  <h4>Select a Subject</h4><div id="subjects"></div>
+  <button id="selectionsSubmitButton">View Selections</button>
+</div>
+<div id="report-view" class="hidden">
+  <button id="breakdown">Breakdown</button>
+  <button id="download">Download</button>
+</div>
+<div id="breakdown-dialog" class="MuiDialog-root hidden">
+  <div>Breakdown by Demographic</div>
+  <label class="MuiFormControlLabel-root"><input type="checkbox" name="breakdown" value="Ethnicity">Ethnicity</label>
+  <label class="MuiFormControlLabel-root"><input type="checkbox" name="breakdown" value="Economically Disadvantaged">Economically Disadvantaged</label>
+  <button id="apply">Apply</button>
+</div>
+<div id="download-dialog" class="MuiDialog-root hidden">
+  <form id="filename-form">
+    <input type="text" class="MuiInputBase-input MuiOutlinedInput-input MuiInputBase-inputSizeSmall" value="report">
+    <div class="MuiInputBase-root MuiOutlinedInput-root MuiInputBase-colorPrimary MuiInputBase-sizeSmall css-1gnoy6z">
+      <div class="MuiSelect-select MuiSelect-outlined MuiInputBase-input MuiOutlinedInput-input MuiInputBase-inputSizeSmall css-gyb3x5" id="format">Excel</div>
+    </div>
+    <ul id="format-menu" class="hidden">
+      <li class="MuiMenuItem-root" data-value="xlsx">Excel</li>
+      <li class="MuiMenuItem-root" data-value="csv">CSV</li>
+    </ul>
+  </form>
+  <button type="submit" form="filename-form" class="MuiButtonBase-root MuiButton-root MuiButton-contained MuiButton-containedPrimary MuiButton-sizeSmall MuiButton-containedSizeSmall MuiRequestButton MuiRequestButton-root css-1emsfic">Download File</button>
+</div>
+<script>
+const DATA = __DATA__;
+const latency = DATA.latency;
+const $ = id => document.getElementById(id);
+const later = fn => setTimeout(fn, latency);
+const selected = [];
+
+function option(type, name, value) {
+  return `<label class="MuiFormControlLabel-root"><input type="${type}" name="${name}" value="${value}">${value}</label>`;
+}
+function fill(id, type, name, values) {
+  $(id).innerHTML = values.map(v => option(type, name, v)).join('');
+}
+function checked(name) {
+  return Array.from(document.querySelectorAll(`input[name="${name}"]:checked`)).map(i => i.value);
+}
+
+fill('programs', 'radio', 'program', Object.keys(DATA.programs));
+fill('reports', 'radio', 'report', [...new Set(Object.values(DATA.programs).flat())]);
+fill('administrations', 'checkbox', 'administration', DATA.administrations);
+fill('grades', 'checkbox', 'grade', DATA.grades);
+fill('versions', 'radio', 'version', ['STAAR', 'STAAR Alternate 2']);
+fill('subjects', 'checkbox', 'subject', DATA.subjects);
+
+$('search-form').addEventListener('submit', e => {
+  e.preventDefault();
+  const query = document.querySelector('#search-form input').value.trim();
+  later(() => {
+    $('search-form').classList.add('hidden');
+    $('results').innerHTML =
+      `<div class="MuiTableContainer-root selections-table selections-div"><table><tr><td>` +
+      `<input class="PrivateSwitchBase-input" type="checkbox" value="${query}"></td><td>District ${query}</td></tr></table></div>` +
+      `<div class="MuiGrid-root MuiGrid-container"><button class="MuiLink-button" aria-label="Search Again">Search Again</button></div>`;
+    document.querySelector('#results input').addEventListener('change', e => {
+      if (e.target.checked && !selected.includes(query)) selected.push(query);
+      $('selected').textContent = selected.join(';');
+    });
+    document.querySelector('#results button').addEventListener('click', () => {
+      later(() => { $('results').innerHTML = ''; $('search-form').classList.remove('hidden'); });
+    });
+  });
+});
+
+$('selectionsSubmitButton').addEventListener('click', () => later(() => $('report-view').classList.remove('hidden')));
+$('breakdown').addEventListener('click', () => $('breakdown-dialog').classList.remove('hidden'));
+$('apply').addEventListener('click', () => later(() => $('breakdown-dialog').classList.add('hidden')));
+$('download').addEventListener('click', () => $('download-dialog').classList.remove('hidden'));
+$('format').addEventListener('click', () => $('format-menu').classList.remove('hidden'));
+document.querySelectorAll('#format-menu li').forEach(li => li.addEventListener('click', () => {
+  $('format').textContent = li.textContent;
+  $('format').dataset.value = li.dataset.value;
+  $('format-menu').classList.add('hidden');
+}));
+document.querySelector('button[form="filename-form"]').addEventListener('click', e => {
+  e.preventDefault();
+  const params = new URLSearchParams({
+    name: document.querySelector('#filename-form input').value,
+    organizations: selected.join(';'),
+    administrations: checked('administration').join(';'),
+    grades: checked('grade').join(';')
+  });
+  later(() => { window.location.href = `/export?${params}`; $('download-dialog').classList.add('hidden'); });
+});
+</script>
+</body></html>
+"""
+
+def selections_page(latency=0.0):
+    """
+    Returns the mock selections page, with UI responses delayed by latency seconds.
+    """
+    data = {'programs': MOCK_PROGRAMS, 'administrations': MOCK_ADMINISTRATIONS,
+            'grades': MOCK_GRADES, 'subjects': MOCK_SUBJECTS, 'latency': int(latency * 1000)}
+    return SELECTIONS_HTML.replace('__DATA__', json.dumps(data))
+
+def load_recordings(directory):
+    """
+    Loads recorded responses from a directory of JSON files.
+
+    Each file holds one response: {"method", "path", "query" (optional), "status",
+    "content_type", and either "body" (text or JSON) or "body_file" relative to the directory}.
+
+    Returns:
+        dict: (method, path, query) -> (status, content type, body bytes).
+    """
+    recordings = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(directory, name), encoding='utf-8') as file:
+            record = json.load(file)
+        if 'body_file' in record:
+            with open(os.path.join(directory, record['body_file']), 'rb') as file:
+                body = file.read()
+        else:
+            body = record.get('body', '')
+            body = (body if isinstance(body, str) else json.dumps(body)).encode('utf-8')
+        key = (record.get('method', 'GET').upper(), record['path'], record.get('query', ''))
+        recordings[key] = (record.get('status', 200), record.get('content_type', 'application/json'), body)
+    return recordings
+
+class _PortalHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass  # Keep benchmark and test output quiet
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond(self, method, payload=None):
+        url = urlsplit(self.path)
+        path = url.path[len('/api'):] if url.path.startswith('/api/') else url.path
+        recordings = self.server.recordings
+
+        # Exact recording first, then one recorded for the path regardless of query string
+        for key in ((method, path, url.query), (method, path, '')):
+            if key in recordings:
+                return self._send(*recordings[key])
+
+        if method == 'GET' and path == '/selections':
+            return self._send(200, 'text/html; charset=utf-8',
+                              selections_page(self.server.latency).encode('utf-8'))
+        if method == 'GET' and path == '/export':
+            params = parse_qs(url.query)
+            split = lambda key: [v for v in params.get(key, [''])[0].split(';') if v]
+            time.sleep(self.server.latency)
+            body = synthetic_report_csv(split('organizations'), split('administrations'), split('grades'))
+            name = params.get('name', ['report'])[0] or 'report'
+            return self._send(200, 'text/csv', body.encode('utf-8'),
+                              {'Content-Disposition': f'attachment; filename="{name}.csv"'})
+        if method == 'GET' and path == '/selections/search':
+            query = parse_qs(url.query).get('query', [''])[0]
+            body = json.dumps([{'id': query, 'name': f'District {query}', 'cdc': query}] if query else [])
+            return self._send(200, 'application/json', body.encode('utf-8'))
+        if method == 'POST' and path == '/reports/export':
+            payload = payload or {}
+            body = synthetic_report_csv(payload.get('organizations', []),
+                                        payload.get('administrations'), payload.get('grades'))
+            return self._send(200, 'text/csv', body.encode('utf-8'))
+        self._send(404, 'text/plain', b'Not recorded')
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length) if length else b''
+        try:
+            payload = json.loads(raw) if raw else {}
+        except json.JSONDecodeError:
+            payload = {}
+        self._respond('POST', payload)
+
+class MockPortal(ThreadingHTTPServer):
+    def __init__(self, recordings_dir=None, port=0, latency=0.0):
+        """
+        Local stand-in for txresearchportal.com serving recorded responses.
+
+        Requests without a recording fall back to generated search results and synthetic
+        CSV exports, so the HTTP backend can run fully offline. /selections serves a copy of
+        the selections page with the markup and ids Script depends on, so the Selenium
+        backend can run against it too.
+
+        Args:
+            recordings_dir (str, optional): Directory of recorded responses, see load_recordings
+            port (int): Port to listen on, 0 picks a free one
+            latency (float): Seconds the mock page and exports wait before responding
+        """
+        super().__init__(('127.0.0.1', port), _PortalHandler)
+        self.recordings = load_recordings(recordings_dir) if recordings_dir else {}
+        self.latency = latency
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def selections_url(self):
+        return f"{self.url}/selections"
+
+    @property
+    def api_url(self):
+        return f"{self.url}/api"
+
+    def start(self):
+        """
+        Serves requests on a background thread and returns self.
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server and closes its socket.
+        """
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    portal = MockPortal(sys.argv[1] if len(sys.argv) > 1 else None, port=8765)
+    print(f"Mock portal listening on {portal.url}")
+    portal.serve_forever()
@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import shutil
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None  # Only CSV outputs are written without pyarrow
+
+# Output formats processing() can write, csv is the combined file the dashboards read today
+OUTPUT_FORMATS = ('csv', 'parquet', 'feather')
+
+# Key of the statistics stored in the footer of every columnar file
+STATS_KEY = b'staar.stats'
+
+def column_stats(df):
+    """
+    Returns the row count and per-column min, max and null count of a partition.
+    """
+    stats = {'rows': int(len(df)), 'columns': {}}
+    for column in df.columns:
+        series = df[column]
+        entry = {'nulls': int(series.isna().sum())}
+        if series.notna().any() and series.dtype.kind in 'iuf':
+            entry['min'] = float(series.min())
+            entry['max'] = float(series.max())
+        stats['columns'][column] = entry
+    return stats
+
+def _partition_dir(root, keys, values):
+    """
+    Hive-style partition path, e.g. root/Administration=Spring%202023, values URI-encoded.
+    """
+    parts = [f"{key}={quote(str(value), safe='')}" for key, value in zip(keys, values)]
+    return os.path.join(root, *parts)
+
+def write_partitioned(df, subject, output_dir, fmt='parquet', by_organization=False, compression='zstd'):
+    """
+    Writes one subject's combined frame as Parquet or Feather files, one per partition.
+
+    Files go to output_dir/<fmt>/subject=<subject>/Administration=<value>[/Organization=<value>]/part-0.<fmt>.
+    Partition columns live in the directory names only, so readers such as
+    pyarrow.dataset or DuckDB can skip partitions and columns they do not need. Each
+    file's footer carries its row count and per-column min, max and null counts under
+    the 'staar.stats' metadata key. The subject directory is replaced as a whole, so
+    readers never see a mix of old and new partitions.
+
+    Args:
+        df (pd.DataFrame): The subject's combined, sorted frame
+        subject (str): Subject name used in the directory, e.g. 'math'
+        output_dir (str): The clean output directory
+        fmt (str): 'parquet' or 'feather'
+        by_organization (bool): Also partition by Organization
+        compression (str): Codec, e.g. 'zstd', 'snappy' (Parquet only), 'lz4' or 'uncompressed'
+
+    Returns:
+        list[str]: The written files, or an empty list when pyarrow is not installed.
+    """
+    if pa is None:
+        print(f"pyarrow is not installed, skipping {fmt} output for {subject}")
+        return []
+
+    root = os.path.join(output_dir, fmt, f"subject={subject}")
+    staging = root + '.part'
+    shutil.rmtree(staging, ignore_errors=True)
+
+    keys = ['Administration'] + (['Organization'] if by_organization else [])
+    written = []
+    for values, part in df.groupby(keys, sort=True, observed=True):
+        values = values if isinstance(values, tuple) else (values,)
+        directory = _partition_dir(staging, keys, values)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-0.{fmt}")
+
+        part = part.drop(columns=keys)
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        footer = dict(table.schema.metadata or {})
+        footer[STATS_KEY] = json.dumps(dict(column_stats(part), written=time.time())).encode('utf-8')
+        table = table.replace_schema_metadata(footer)
+
+        if fmt == 'parquet':
+            pq.write_table(table, path, compression=compression, write_statistics=True)
+        else:
+            feather.write_feather(table, path, compression=compression)
+        written.append(path)
+
+    os.makedirs(staging, exist_ok=True)
+
+    # Swap the new partitions in, then drop the old ones
+    previous = root + '.old'
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(root):
+        os.replace(root, previous)
+    os.replace(staging, root)
+    shutil.rmtree(previous, ignore_errors=True)
+
+    print(f"{subject.capitalize()} {fmt} output: {len(written)} partitions in {root}")
+    return [p.replace(staging, root, 1) for p in written]
+
+def read_stats(path):
+    """
+    Returns the statistics footer of a Parquet or Feather file written by write_partitioned.
+    """
+    if path.endswith('.parquet'):
+        metadata = pq.read_schema(path).metadata or {}
+    else:
+        metadata = feather.read_table(path, memory_map=True).schema.metadata or {}
+    return json.loads(metadata[STATS_KEY]) if STATS_KEY in metadata else None
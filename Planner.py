@@ -0,0 +1,105 @@
+import math
+from typing import Dict, List
+
+from Catalog import source_lines
+
+# Query fields that must match for two rows to share a browser session
+SHARED_FIELDS = ('program', 'report', 'administration', 'subject', 'grade', 'version', 'cluster')
+
+def _unique(values):
+    """
+    Returns the non-empty values with surrounding whitespace removed, first occurrence kept.
+    """
+    seen = []
+    for value in values:
+        value = value.strip()
+        if value and value not in seen:
+            seen.append(value)
+    return seen
+
+def _group_key(query):
+    key = []
+    for field in SHARED_FIELDS:
+        value = query.get(field, '')
+        # Sorted like query_fingerprint, so rows listing the same values in another order merge
+        key.append(tuple(sorted(_unique(value))) if isinstance(value, list) else value)
+    return tuple(key)
+
+def _chunk(districts, chunk_size):
+    """
+    Splits districts into the fewest chunks of at most chunk_size, with sizes differing by at most one.
+    """
+    count = max(1, math.ceil(len(districts) / chunk_size))
+    base, extra = divmod(len(districts), count)
+    chunks, start = [], 0
+    for i in range(count):
+        end = start + base + (1 if i < extra else 0)
+        chunks.append(districts[start:end])
+        start = end
+    return chunks
+
+def plan_queries(queries: List[Dict], chunk_size: int = 20):
+    """
+    Turns the rows from load_queries into balanced browser sessions.
+
+    Empty and duplicate districts are dropped, rows sharing every other parameter are
+    merged, and each merged district list is re-split into even chunks.
+
+    Args:
+        queries (List[Dict]): Queries as returned by load_queries
+        chunk_size (int): Maximum number of districts selected in one session
+
+    Returns:
+        List[Dict]: The planned queries, one per browser session. Each keeps the CSV lines of
+            the rows merged into it under 'lines', 'line' stays the first of them.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+    groups = {}
+    for query in queries:
+        key = _group_key(query)
+        if key not in groups:
+            groups[key] = {'query': query, 'district': [], 'lines': []}
+        groups[key]['district'].extend(query.get('district', []))
+        if 'line' in query and query['line'] not in groups[key]['lines']:
+            groups[key]['lines'].append(query['line'])
+
+    plan = []
+    for group in groups.values():
+        districts = _unique(group['district'])
+        if not districts:
+            continue
+        for chunk in _chunk(districts, chunk_size):
+            planned = dict(group['query'])
+            for field in SHARED_FIELDS:
+                if isinstance(planned.get(field), list):
+                    planned[field] = _unique(planned[field])
+            planned['district'] = chunk
+            if group['lines']:
+                planned['lines'] = sorted(group['lines'])
+                planned['line'] = planned['lines'][0]
+            plan.append(planned)
+
+    print_plan(queries, plan)
+    return plan
+
+def print_plan(queries: List[Dict], plan: List[Dict]):
+    """
+    Prints the planned sessions and how they compare to the raw rows.
+
+    Args:
+        queries (List[Dict]): The rows before planning
+        plan (List[Dict]): The planned sessions
+    """
+    raw_districts = sum(len(q.get('district', [])) for q in queries)
+    planned_districts = sum(len(q['district']) for q in plan)
+
+    print(f"\nQuery plan: {len(queries)} rows, {raw_districts} districts -> "
+          f"{len(plan)} sessions, {planned_districts} districts")
+    for i, query in enumerate(plan, start=1):
+        print(f"  Session {i}: {query['program']} | {query['report']} | "
+              f"{len(query['district'])} districts | "
+              f"{', '.join(query.get('administration', []))} | "
+              f"{', '.join(query.get('subject', []))} | "
+              f"{len(query.get('grade', []))} grades | {source_lines(query)}")
+    print(f"Estimated browser sessions: {len(plan)}\n")
@@ -1,116 +1,648 @@
 import os
+import io
+import csv
+import time
+import codecs
+import threading
+import contextlib
+from queue import Queue
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
-def processing():
+from Cache import ProcessingCache
+from Outputs import write_partitioned
+from Store import ResultsStore
+from Schema import detect_schema, extract_long, subject_slug, OPTIONAL_ID_COLUMNS
+
+try:
+    import pyarrow
+    import pyarrow.csv as pacsv
+except ImportError:
+    pyarrow = None  # engine='pyarrow' falls back to the C parser
+
+# Command-line names of the CSV engines and the engine argument they map to
+CSV_ENGINES = {'pandas': 'c', 'pyarrow': 'pyarrow'}
+
+# Define the desired order for Student Groups
+STUDENT_GROUP_ORDER = ['All Students', 'Hispanic/Latino', 'Economically Disadvantaged']
+
+ID_COLUMNS = ['Organization', 'ID/CDC', 'Administration', 'Tested Grade', 'Student Group']
+MATH_COLUMNS = ['STAAR - Mathematics|Tests Taken',
+                'STAAR - Mathematics|Performance Levels|Meets and Above|Count',
+                'STAAR - Mathematics|Performance Levels|Masters|Count']
+READING_COLUMNS = ['STAAR - Reading|Tests Taken',
+                   'STAAR - Reading|Performance Levels|Meets and Above|Count',
+                   'STAAR - Reading|Performance Levels|Masters|Count']
+REQUIRED_COLUMNS = ID_COLUMNS + MATH_COLUMNS + READING_COLUMNS
+
+# Explicit types for the required columns, CDC codes stay text so leading zeros survive
+COLUMN_DTYPES = dict({column: 'string' for column in ID_COLUMNS},
+                     **{column: 'Int64' for column in MATH_COLUMNS + READING_COLUMNS})
+
+# Bytes read up front to sniff the encoding and the header
+SNIFF_BYTES = 64 * 1024
+
+def _read_prefix(source):
+    """
+    Returns the first SNIFF_BYTES of a path or buffer, rewinding the buffer.
+    """
+    if hasattr(source, 'read'):
+        prefix = source.read(SNIFF_BYTES)
+        source.seek(0)
+        return prefix if isinstance(prefix, bytes) else prefix.encode('utf-8')
+    with open(source, 'rb') as file:
+        return file.read(SNIFF_BYTES)
+
+def sniff_encoding(prefix):
+    """
+    Picks the encoding of a report from its first bytes: utf-8-sig, utf-8 or latin1.
+    """
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # Incremental, so a character cut off at the end of the prefix is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+def read_header(prefix, encoding):
+    """
+    Returns the column names in the first line of a report.
+    """
+    text = prefix.decode(encoding, errors='ignore')
+    return next(csv.reader(io.StringIO(text)), [])
+
+def sniff_report(source):
+    """
+    Returns (encoding, header) of a report, read from its first SNIFF_BYTES.
+    """
+    prefix = _read_prefix(source)
+    encoding = sniff_encoding(prefix)
+    return encoding, read_header(prefix, encoding)
+
+def _read_arrow(source, usecols, dtype, encoding):
+    """
+    Reads columns with pyarrow.csv, converting the typed ones while parsing.
+
+    pd.read_csv(engine='pyarrow') applies dtype only after pyarrow inferred the column,
+    which turns CDC codes such as '001907' into 1907.
+    """
+    types = {column: pyarrow.string() if kind == 'string' else pyarrow.int64() for column, kind in dtype.items()}
+    options = pacsv.ConvertOptions(include_columns=usecols, column_types=types, strings_can_be_null=True)
+    try:
+        table = pacsv.read_csv(source, read_options=pacsv.ReadOptions(encoding=encoding), convert_options=options)
+    except pyarrow.ArrowInvalid as e:
+        if 'UTF8' in str(e):
+            raise UnicodeError(str(e))
+        raise
+    # Untyped columns holding bytes invalid in the encoding are read as binary instead of failing
+    binary = [field.name for field in table.schema if pyarrow.types.is_binary(field.type)]
+    if binary:
+        raise UnicodeError(f"columns {binary} are not valid {encoding}")
+    return table.to_pandas(types_mapper={pyarrow.string(): pd.StringDtype(), pyarrow.int64(): pd.Int64Dtype()}.get)
+
+def _read_columns(source, usecols, dtype, encoding, engine='c'):
+    """
+    Reads some columns of a report, retrying when the sniffed encoding or the types do not hold.
+
+    A byte past the sniffed prefix that is not valid in the encoding rereads the file as
+    latin1, a value that does not fit its type, such as a suppressed count '*', rereads the
+    typed columns as text.
+
+    Args:
+        source (str or file-like): Path of the CSV, or a buffer holding it
+        usecols (list[str]): Columns to read
+        dtype (dict): {column: 'string' or 'Int64'} for the typed columns, others are inferred
+        encoding (str): The sniffed encoding
+        engine (str): 'c', or 'pyarrow' when pyarrow is installed
+
+    Returns:
+        pd.DataFrame: The columns in usecols order.
+    """
+    if engine == 'pyarrow' and pyarrow is None:
+        engine = 'c'
+    while True:
+        try:
+            if engine == 'pyarrow':
+                df = _read_arrow(source, usecols, dtype, encoding)
+            else:
+                df = pd.read_csv(source, usecols=usecols, dtype=dtype, encoding=encoding, engine=engine)
+            return df[usecols]
+        # UnicodeError is a ValueError, so it has to be caught first
+        except UnicodeError:
+            if encoding == 'latin1':
+                raise
+            encoding = 'latin1'
+        except (ValueError, TypeError):
+            if all(kind == 'string' for kind in dtype.values()):
+                raise
+            dtype = {column: 'string' for column in dtype}
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+def _parse_stats(df, header, start):
+    """
+    Returns the stats of a column-pruned read: 'seconds' since start, 'columns' in the file
+    and 'saved_mb', the memory of the skipped columns estimated from the average kept column.
+    """
+    used_mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+    saved_mb = used_mb / len(df.columns) * (len(header) - len(df.columns))
+    return {'seconds': time.perf_counter() - start, 'columns': len(header), 'saved_mb': saved_mb}
+
+def read_report(source, name, engine='c'):
+    """
+    Reads only the required columns of a raw report, with explicit types.
+
+    Args:
+        source (str or file-like): Path of the CSV, or a buffer holding it
+        name (str): Name used in messages
+        engine (str): 'c', or 'pyarrow' when pyarrow is installed
+
+    Returns:
+        tuple: (DataFrame, stats) where stats holds 'seconds', 'columns' and 'saved_mb', or
+            (None, None) when the report lacks required columns.
+    """
+    start = time.perf_counter()
+    encoding, header = sniff_report(source)
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        print(f"Warning: Missing columns in {name}: {missing}")
+        return None, None
+
+    df = _read_columns(source, REQUIRED_COLUMNS, COLUMN_DTYPES, encoding, engine)
+    return df, _parse_stats(df, header, start)
+
+def process_report(source, name, engine='c', stats=None):
+    """
+    Parses one raw report and splits it into math and reading rows for the kept student groups.
+
+    Args:
+        source (str or file-like): Path of the CSV, or a buffer holding it
+        name (str): Name used in messages
+        engine (str): CSV engine, see read_report
+        stats (list, optional): The read_report stats of the file are appended to it
+
+    Returns:
+        tuple: (math_df, reading_df), or None when the report lacks the required columns.
+    """
+    df, read_stats = read_report(source, name, engine)
+    if df is None:
+        return None
+    print(f"Processing {name}... parsed {len(REQUIRED_COLUMNS)} of {read_stats['columns']} columns "
+          f"in {read_stats['seconds']:.2f}s (~{read_stats['saved_mb']:.1f} MB not loaded)")
+    if stats is not None:
+        stats.append(read_stats)
+
+    # Filter for specified student groups only
+    df = df[df['Student Group'].isin(STUDENT_GROUP_ORDER)]
+
+    # Create a categorical type for Student Group with custom ordering
+    df['Student Group'] = pd.Categorical(df['Student Group'],
+                                       categories=STUDENT_GROUP_ORDER,
+                                       ordered=True)
+
+    # Create separate DataFrames for math and reading data
+    math_df = df[ID_COLUMNS + MATH_COLUMNS].copy()
+    reading_df = df[ID_COLUMNS + READING_COLUMNS].copy()
+    return math_df, reading_df
+
+def extract_report(source, name, engine='c', stats=None):
+    """
+    Parses one raw report in a single pass into the long table of every subject it holds.
+
+    The columns to keep come from the schema detected on the header, see Schema.SCHEMAS,
+    so reports of any program or subject are read without a per-subject column list.
+
+    Args:
+        source (str or file-like): Path of the CSV, or a buffer holding it
+        name (str): Name used in messages
+        engine (str): CSV engine, see read_report
+        stats (list, optional): The parse stats of the file are appended to it
+
+    Returns:
+        pd.DataFrame: The long table, see Schema.extract_long, or None when no schema matches.
+    """
+    start = time.perf_counter()
+    encoding, header = sniff_report(source)
+    schema, columns = detect_schema(header)
+    missing = [column for column in ID_COLUMNS if column not in header and column not in OPTIONAL_ID_COLUMNS]
+    if schema is None or missing:
+        print(f"Warning: No known schema in {name}, missing columns: {missing}")
+        return None
+
+    ids = [column for column in ID_COLUMNS if column in header]
+    df = _read_columns(source, ids + list(columns), {column: 'string' for column in ids}, encoding, engine)
+    read_stats = _parse_stats(df, header, start)
+    long = extract_long(df, columns)
+    print(f"Processing {name}... {schema} schema, {long['subject'].nunique()} subjects, "
+          f"parsed {len(df.columns)} of {len(header)} columns in {read_stats['seconds']:.2f}s")
+    if stats is not None:
+        stats.append(read_stats)
+    return long
+
+# What each output layout parses a report into
+LAYOUTS = {'wide': process_report, 'tidy': extract_report}
+
+def write_combined(dfs, output_path, label, formats=('csv',), by_organization=False):
+    """
+    Concatenates, sorts and writes one subject's frames.
+
+    The file is written next to its final name and renamed into place, so readers never
+    see a half written output while a pipeline run rewrites it.
+
+    Args:
+        dfs (list[pd.DataFrame]): The subject's frames, one per report
+        output_path (str): Path of the combined CSV
+        label (str): Subject name used in messages
+        formats (tuple[str]): Any of 'csv', 'parquet' and 'feather', see Outputs.write_partitioned
+        by_organization (bool): Also partition columnar outputs by Organization
+
+    Returns:
+        pd.DataFrame: The combined frame, or None when there were no frames.
+    """
+    if not dfs:
+        return None
+    combined_df = pd.concat(dfs, ignore_index=True)
+    # Sort the combined dataframe
+    combined_df = combined_df.sort_values(
+        by=['Organization', 'Student Group', 'Tested Grade'],
+        ascending=[True, True, True]
+    )
+
+    for fmt in formats:
+        if fmt != 'csv':
+            write_partitioned(combined_df, label.lower(), os.path.dirname(output_path), fmt, by_organization)
+    if 'csv' not in formats:
+        return combined_df
+
+    tmp_path = output_path + '.part'
+    combined_df.to_csv(tmp_path, index=False, encoding='utf-8')
+    os.replace(tmp_path, output_path)
+
+    # Verify the file was written correctly
+    try:
+        pd.read_csv(output_path)
+        print(f"{label} data successfully saved to {output_path}")
+    except Exception as e:
+        print(f"Error verifying {label.lower()} file: {e}")
+    return combined_df
+
+def write_tidy(frames, output_dir, formats=('csv',), by_organization=False):
+    """
+    Writes the long tables of many reports as one output per subject.
+
+    CSVs go to output_dir/tidy/<subject>.csv, columnar formats to output_dir/tidy/<fmt>/subject=<subject>.
+
+    Args:
+        frames (list[pd.DataFrame]): Long tables, one per report, see extract_report
+        output_dir (str): The clean output directory
+        formats (tuple[str]): Any of 'csv', 'parquet' and 'feather', see Outputs.write_partitioned
+        by_organization (bool): Also partition columnar outputs by Organization
+
+    Returns:
+        pd.DataFrame: The long table of all reports, or None when there were no frames.
+    """
+    if not frames:
+        return None
+    tidy_dir = os.path.join(output_dir, 'tidy')
+    os.makedirs(tidy_dir, exist_ok=True)
+    combined_df = pd.concat(frames, ignore_index=True)
+    combined_df = combined_df.sort_values(
+        by=['Organization', 'Administration', 'Tested Grade', 'Student Group', 'test', 'metric'],
+        kind='stable'
+    )
+
+    for subject, df in combined_df.groupby('subject', sort=True):
+        slug = subject_slug(subject)
+        df = df.drop(columns='subject')
+        for fmt in formats:
+            if fmt != 'csv':
+                write_partitioned(df, slug, tidy_dir, fmt, by_organization)
+        if 'csv' not in formats:
+            continue
+        output_path = os.path.join(tidy_dir, f"{slug}.csv")
+        tmp_path = output_path + '.part'
+        df.to_csv(tmp_path, index=False, encoding='utf-8')
+        os.replace(tmp_path, output_path)
+        print(f"{subject} tidy data: {len(df)} rows saved to {output_path}")
+    return combined_df
+
+def cached_process_report(path, name, engine='c', stats=None, cache=None, layout='wide'):
+    """
+    process_report, or extract_report for the tidy layout, for a file on disk, served from
+    the cache when the file is unchanged.
+
+    Args:
+        path (str): Path of the raw report
+        name (str): Name used in messages
+        engine (str): CSV engine, see read_report
+        stats (list, optional): Collects read_report stats of files that were parsed
+        cache (ProcessingCache, optional): Cache to read and fill, holding results of this layout only
+        layout (str): 'wide' or 'tidy', see LAYOUTS
+
+    Returns:
+        The result of the layout's parser, None when it rejected the report.
+    """
+    if cache is not None:
+        try:
+            return cache.get(path)
+        except KeyError:
+            pass
+    result = LAYOUTS[layout](path, name, engine, stats)
+    if cache is not None:
+        cache.put(path, result)
+    return result
+
+def _process_in_worker(path, name, engine, layout='wide'):
+    """
+    Runs the layout's parser in a pool process and returns its messages instead of printing them,
+    so the parent can print them in file order.
+
+    Returns:
+        tuple: (result, stats, messages, error)
+    """
+    out = io.StringIO()
+    stats = []
+    try:
+        with contextlib.redirect_stdout(out):
+            result = LAYOUTS[layout](path, name, engine, stats)
+        return result, stats, out.getvalue(), None
+    except Exception as e:
+        return None, stats, out.getvalue(), f"An error occurred while processing {name}: {e}"
+
+def process_reports(files, engine='c', stats=None, cache=None, workers=1, layout='wide'):
+    """
+    Processes many raw reports, in a process pool when workers > 1.
+
+    Results and messages come back in the order of files whatever order the workers finish
+    in, so the combined outputs are the same for any number of workers. A report that
+    raises is reported and skipped.
+
+    Args:
+        files (list[tuple]): (path, name) of each report
+        engine (str): CSV engine, see read_report
+        stats (list, optional): Collects read_report stats of files that were parsed
+        cache (ProcessingCache, optional): Cache to read and fill
+        workers (int): Processes parsing in parallel, 1 parses in this process
+        layout (str): 'wide' or 'tidy', see LAYOUTS
+
+    Returns:
+        tuple: (results, errors) where results holds one parser result per file and
+            errors the messages of reports that raised.
+    """
+    stats = stats if stats is not None else []
+    results = [None] * len(files)
+    errors = []
+    todo = []
+    for i, (path, name) in enumerate(files):
+        if cache is not None:
+            try:
+                results[i] = cache.get(path)
+                continue
+            except KeyError:
+                pass
+        todo.append(i)
+
+    if workers > 1 and len(todo) > 1:
+        paths = [files[i][0] for i in todo]
+        names = [files[i][1] for i in todo]
+        chunksize = max(1, len(todo) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_process_in_worker, paths, names, [engine] * len(todo),
+                                     [layout] * len(todo), chunksize=chunksize))
+    else:
+        outcomes = (_process_in_worker(files[i][0], files[i][1], engine, layout) for i in todo)
+
+    for i, (result, file_stats, messages, error) in zip(todo, outcomes):
+        print(messages, end='')
+        stats.extend(file_stats)
+        if error:
+            print(error)
+            errors.append(error)
+            continue
+        results[i] = result
+        if cache is not None:
+            cache.put(files[i][0], result)
+    return results, errors
+
+def print_parse_stats(stats):
+    """
+    Prints the total parse time and memory saved over a set of read_report stats.
+    """
+    if not stats:
+        return
+    print(f"Parsed {len(stats)} reports in {sum(s['seconds'] for s in stats):.2f}s, "
+          f"~{sum(s['saved_mb'] for s in stats):.1f} MB of unused columns not loaded")
+
+def cache_dir(download_dir, layout='wide'):
+    """
+    Directory of the processing cache of a layout, each layout caches its own results.
+    """
+    cache = os.path.join(download_dir, 'cache')
+    return cache if layout == 'wide' else os.path.join(cache, layout)
+
+def processing(engine='c', use_cache=True, workers=1, formats=('csv',), by_organization=False, layout='wide',
+               database=None):
+    """
+    Cleans every report in downloads/ into combined_math.csv and combined_reading.csv, or
+    with the tidy layout into one long table per subject under clean/tidy/.
+
+    Args:
+        engine (str): CSV engine, 'c' or 'pyarrow' when pyarrow is installed
+        use_cache (bool): Reuse the frames of reports unchanged since the last run from downloads/cache
+        workers (int): Processes parsing reports in parallel, the outputs do not depend on it
+        formats (tuple[str]): Output formats, any of 'csv', 'parquet' and 'feather'
+        by_organization (bool): Also partition Parquet and Feather outputs by Organization
+        layout (str): 'wide' for the math and reading outputs, 'tidy' for every subject in long form
+        database (str, optional): Also upsert the results into this database file, see Store.ResultsStore
+    """
     # Specify the directory where the CSV files are downloaded
     download_dir = 'downloads'
-    
+
     # Specify the output folder structure where the final CSV will be saved
     output_dir = os.path.join(download_dir, 'clean')
-    
+
     # Create the directories if they don't exist
     os.makedirs(output_dir, exist_ok=True)
-    
-    # Define the desired order for Student Groups
-    student_group_order = ['All Students', 'Hispanic/Latino', 'Economically Disadvantaged']
-    
+
     # Get a list of all CSV files in the download directory
-    csv_files = [f for f in os.listdir(download_dir) if f.endswith('.csv')]
+    csv_files = sorted(f for f in os.listdir(download_dir) if f.endswith('.csv'))
     print(f"Found {len(csv_files)} CSV files in {download_dir}")
-    
+
     # Create empty lists to store math and reading dataframes
     math_dfs = []
     reading_dfs = []
-    
+    stats = []
+
+    # Only new or changed reports are parsed, entries of deleted reports are dropped
+    cache = ProcessingCache(cache_dir(download_dir, layout)) if use_cache else None
+    if cache:
+        cache.evict(os.path.join(download_dir, f) for f in csv_files)
+
     try:
-        for csv_file in csv_files:
-            file_path = os.path.join(download_dir, csv_file)
-            
-            # Add error handling for reading CSV
-            try:
-                df = pd.read_csv(file_path, encoding='utf-8')
-            except UnicodeDecodeError:
-                # Try alternative encoding if UTF-8 fails
-                df = pd.read_csv(file_path, encoding='latin1')
-            
-            print(f"Processing {csv_file}...")
-            
-            # Keep only the required columns
-            try:
-                df = df[['Organization', 'ID/CDC', 'Administration', 'Tested Grade', 'Student Group',
-                        'STAAR - Mathematics|Tests Taken', 'STAAR - Mathematics|Performance Levels|Meets and Above|Count',
-                        'STAAR - Mathematics|Performance Levels|Masters|Count', 'STAAR - Reading|Tests Taken',
-                        'STAAR - Reading|Performance Levels|Meets and Above|Count', 'STAAR - Reading|Performance Levels|Masters|Count']]
-            except KeyError as e:
-                print(f"Warning: Missing columns in {csv_file}: {e}")
-                continue
-            
-            # Filter for specified student groups only
-            df = df[df['Student Group'].isin(student_group_order)]
-            
-            # Create a categorical type for Student Group with custom ordering
-            df['Student Group'] = pd.Categorical(df['Student Group'], 
-                                               categories=student_group_order, 
-                                               ordered=True)
-            
-            # Create separate DataFrames for math and reading data
-            math_df = df[['Organization', 'ID/CDC', 'Administration', 'Tested Grade', 'Student Group',
-                         'STAAR - Mathematics|Tests Taken', 
-                         'STAAR - Mathematics|Performance Levels|Meets and Above|Count',
-                         'STAAR - Mathematics|Performance Levels|Masters|Count']].copy()
-            
-            reading_df = df[['Organization', 'ID/CDC', 'Administration', 'Tested Grade', 'Student Group',
-                           'STAAR - Reading|Tests Taken', 
-                           'STAAR - Reading|Performance Levels|Meets and Above|Count',
-                           'STAAR - Reading|Performance Levels|Masters|Count']].copy()
-            
-            # Append to respective lists
-            math_dfs.append(math_df)
-            reading_dfs.append(reading_df)
-        
-        # Combine all math dataframes
-        if math_dfs:
-            combined_math_df = pd.concat(math_dfs, ignore_index=True)
-            # Sort the combined math dataframe
-            combined_math_df = combined_math_df.sort_values(
-                by=['Organization', 'Student Group', 'Tested Grade'],
-                ascending=[True, True, True]
-            )
-            
-            # Write math data
-            math_output_path = os.path.join(output_dir, 'combined_math.csv')
-            combined_math_df.to_csv(math_output_path, index=False, encoding='utf-8')
-            
-            # Verify the file was written correctly
-            try:
-                pd.read_csv(math_output_path)
-                print(f"Math data successfully saved to {math_output_path}")
-            except Exception as e:
-                print(f"Error verifying math file: {e}")
-        
-        # Combine all reading dataframes
-        if reading_dfs:
-            combined_reading_df = pd.concat(reading_dfs, ignore_index=True)
-            # Sort the combined reading dataframe
-            combined_reading_df = combined_reading_df.sort_values(
-                by=['Organization', 'Student Group', 'Tested Grade'],
-                ascending=[True, True, True]
-            )
-            
-            # Write reading data
-            reading_output_path = os.path.join(output_dir, 'combined_reading.csv')
-            combined_reading_df.to_csv(reading_output_path, index=False, encoding='utf-8')
-            
-            # Verify the file was written correctly
-            try:
-                pd.read_csv(reading_output_path)
-                print(f"Reading data successfully saved to {reading_output_path}")
-            except Exception as e:
-                print(f"Error verifying reading file: {e}")
-    
+        files = [(os.path.join(download_dir, f), f) for f in csv_files]
+        results, errors = process_reports(files, engine, stats, cache, workers, layout)
+        if layout == 'tidy':
+            outputs = {'tidy': write_tidy([r for r in results if r is not None], output_dir, formats,
+                                          by_organization)}
+        else:
+            for result in results:
+                if result is None:
+                    continue
+
+                # Append to respective lists
+                math_dfs.append(result[0])
+                reading_dfs.append(result[1])
+
+            outputs = {
+                'math': write_combined(math_dfs, os.path.join(output_dir, 'combined_math.csv'), 'Math',
+                                       formats, by_organization),
+                'reading': write_combined(reading_dfs, os.path.join(output_dir, 'combined_reading.csv'),
+                                          'Reading', formats, by_organization)
+            }
+        if database:
+            with ResultsStore(database) as store:
+                store.load(outputs)
+        print_parse_stats(stats)
+        if errors:
+            print(f"{len(errors)} reports could not be processed")
+        if cache:
+            cache.save()
+            cache.report()
+
     except Exception as e:
         print(f"An error occurred during processing: {e}")
 
+class ProcessingPipeline(threading.Thread):
+    def __init__(self, download_dir: str = 'downloads', flush_interval: float = 30, engine: str = 'c',
+                 use_cache: bool = True, formats=('csv',), by_organization: bool = False, layout: str = 'wide',
+                 database: str = None):
+        """
+        Processes reports while the scrape is still running.
+
+        Reports already in download_dir are parsed first, then every report submitted by the
+        download workers is parsed as it arrives. The combined outputs are rewritten from the
+        parsed frames at most every flush_interval seconds and once more on close(), so no
+        file is ever parsed twice.
+
+        Args:
+            download_dir (str): Directory holding the stored reports, outputs go to its clean/ folder
+            flush_interval (float): Minimum seconds between rewrites of the combined outputs
+            engine (str): CSV engine, see read_report
+            use_cache (bool): Load unchanged reports from downloads/cache, as processing() does
+            formats (tuple[str]): Output formats, as in processing()
+            by_organization (bool): Also partition Parquet and Feather outputs by Organization
+            layout (str): Output layout, as in processing()
+            database (str, optional): Upsert the final results into this database file on close()
+        """
+        threading.Thread.__init__(self, name='processing', daemon=True)
+        self.download_dir = download_dir
+        self.output_dir = os.path.join(download_dir, 'clean')
+        self.flush_interval = flush_interval
+        self.engine = engine
+        self.formats = formats
+        self.by_organization = by_organization
+        self.layout = layout
+        self.database = database
+        self.outputs = {}  # table -> frame last written, loaded into the database on close()
+        self.stats = []
+        self.cache = ProcessingCache(cache_dir(download_dir, layout)) if use_cache else None
+        self.inbox = Queue()
+        self.frames = {}  # report name -> parsed result, a rerun report replaces its entry
+        self.dirty = False
+        self.last_flush = 0.0
+        self.processed = 0
+        self._seed()
+
+    def submit(self, name, source):
+        """
+        Queues a report for processing, safe to call from any worker thread.
+
+        Args:
+            name (str): File name of the report, e.g. the stored file's basename
+            source (str or file-like): Path of the report, or a buffer holding it
+        """
+        self.inbox.put((name, source))
+
+    def submit_path(self, query, path):
+        """
+        Queues a stored report, with the (query, path) signature of the download callbacks.
+        """
+        self.submit(os.path.basename(path), path)
+
+    def submit_capture(self, report):
+        """
+        Queues a CapturedReport straight from memory.
+        """
+        self.submit(f"{report.fingerprint}.csv", report.buffer())
+
+    def _seed(self):
+        # Queued ahead of any submission, so a report rerun in this run replaces its old frame
+        os.makedirs(self.output_dir, exist_ok=True)
+        names = sorted(n for n in os.listdir(self.download_dir) if n.endswith('.csv'))
+        if self.cache:
+            self.cache.evict(os.path.join(self.download_dir, n) for n in names)
+        for name in names:
+            self.inbox.put((name, os.path.join(self.download_dir, name)))
+
+    def _flush(self):
+        # Same file order as processing() so the outputs match a batch run
+        names = sorted(self.frames)
+        if self.layout == 'tidy':
+            self.outputs = {'tidy': write_tidy([self.frames[n] for n in names], self.output_dir,
+                                               self.formats, self.by_organization)}
+        else:
+            self._flush_wide(names)
+        self.dirty = False
+        self.last_flush = time.monotonic()
+
+    def _flush_wide(self, names):
+        self.outputs['math'] = write_combined([self.frames[n][0] for n in names],
+                       os.path.join(self.output_dir, 'combined_math.csv'), 'Math',
+                       self.formats, self.by_organization)
+        self.outputs['reading'] = write_combined([self.frames[n][1] for n in names],
+                       os.path.join(self.output_dir, 'combined_reading.csv'), 'Reading',
+                       self.formats, self.by_organization)
+
+    def run(self):
+        while True:
+            item = self.inbox.get()
+            if item is None:
+                break
+            name, source = item
+            try:
+                if isinstance(source, str):
+                    result = cached_process_report(source, name, self.engine, self.stats, self.cache,
+                                                   self.layout)
+                else:
+                    result = LAYOUTS[self.layout](source, name, self.engine, self.stats)
+                if result is not None:
+                    self.frames[name] = result
+                    self.processed += 1
+                    self.dirty = True
+            except Exception as e:
+                print(f"An error occurred while processing {name}: {e}")
+            if self.dirty and self.inbox.empty() and time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+        if self.dirty:
+            self._flush()
+
+    def close(self):
+        """
+        Processes what is still queued, writes the final outputs and stops the thread.
+        """
+        self.inbox.put(None)
+        self.join()
+        print(f"Pipeline processed {self.processed} reports")
+        print_parse_stats(self.stats)
+        if self.database:
+            with ResultsStore(self.database) as store:
+                store.load(self.outputs)
+        if self.cache:
+            self.cache.save()
+            self.cache.report()
+
 def verify_files(directory):
     """
     Verify that all CSV files in the directory can be opened
@@ -129,4 +661,4 @@ def verify_files(directory):
 if __name__ == "__main__":
     processing()
     # Verify the output files
-    verify_files(os.path.join('downloads', 'clean'))
\ No newline at end of file
+    verify_files(os.path.join('downloads', 'clean'))
@@ -0,0 +1,145 @@
+import heapq
+import itertools
+from queue import Queue
+from typing import Dict, List
+
+from Downloads import query_fingerprint
+from Planner import _chunk
+
+# Cost of a query with no history: seconds per browser session plus seconds per report cell
+DEFAULT_OVERHEAD = 60.0
+DEFAULT_PER_UNIT = 2.0
+
+def query_units(query):
+    """
+    Size of a query in report cells: districts x administrations x subjects x grades.
+    """
+    units = max(1, len(query.get('district') or []))
+    for field in ('administration', 'subject', 'grade'):
+        units *= max(1, len(query.get(field) or []))
+    return units
+
+class CostModel:
+    def __init__(self, entries=None, overhead: float = DEFAULT_OVERHEAD, per_unit: float = DEFAULT_PER_UNIT):
+        """
+        Estimates how many seconds a query takes from its shape and from earlier runs.
+
+        Fits duration = overhead + per_unit * units over the finished manifest entries, and
+        uses the recorded duration directly for a query that already ran once.
+
+        Args:
+            entries (iterable, optional): Manifest entries, e.g. Manifest.entries.values()
+            overhead (float): Seconds per session used until there is enough history
+            per_unit (float): Seconds per report cell used until there is enough history
+        """
+        self.overhead = overhead
+        self.per_unit = per_unit
+        self.history = {}
+        samples = []
+        for entry in entries or []:
+            if entry.get('status') != 'done' or not entry.get('duration') or not entry.get('units'):
+                continue
+            self.history[entry['fingerprint']] = entry['duration']
+            samples.append((entry['units'], entry['duration']))
+        self._fit(samples)
+
+    def _fit(self, samples):
+        """
+        Least-squares line through (units, duration), kept only when both terms come out positive.
+        """
+        if len({units for units, _ in samples}) < 2:
+            return
+        n = len(samples)
+        mean_x = sum(x for x, _ in samples) / n
+        mean_y = sum(y for _, y in samples) / n
+        var = sum((x - mean_x) ** 2 for x, _ in samples)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in samples) / var
+        intercept = mean_y - slope * mean_x
+        if slope > 0 and intercept >= 0:
+            self.overhead, self.per_unit = intercept, slope
+            print(f"Cost model: {intercept:.1f}s per session + {slope:.2f}s per cell "
+                  f"(fitted on {n} past queries)")
+
+    def estimate(self, query):
+        """
+        Predicted seconds for a query.
+        """
+        known = self.history.get(query_fingerprint(query))
+        if known is not None:
+            return known
+        return self.overhead + self.per_unit * query_units(query)
+
+def predict_makespan(costs, workers):
+    """
+    Simulates longest-first assignment of costs to workers and returns the finishing time.
+    """
+    finish = [0.0] * max(1, workers)
+    for cost in sorted(costs, reverse=True):
+        heapq.heapreplace(finish, finish[0] + cost)
+    return max(finish)
+
+class CostQueue(Queue):
+    def __init__(self, model: CostModel, workers: int, min_split: int = 5, manifest=None):
+        """
+        Task queue that hands out the most expensive query first.
+
+        When a worker takes a query while fewer queries are queued or running than there are
+        workers, the query's districts are split into even chunks of at least min_split districts
+        and the other chunks are queued for the idle workers. A split is recorded in the
+        manifest, so a resumed run treats the original query as done once every chunk is.
+
+        Args:
+            model (CostModel): Estimates the cost of each query
+            workers (int): Number of workers reading from the queue
+            min_split (int): Smallest number of districts in a split-off chunk
+            manifest (Manifest, optional): Manifest recording the splits
+        """
+        self.model = model
+        self.workers = workers
+        self.min_split = min_split
+        self.manifest = manifest
+        self.splits = 0
+        super().__init__()
+
+    def _init(self, maxsize):
+        self.queue = []
+        self.counter = itertools.count()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        # Poison pills sort after every real query
+        key = float('inf') if item is None else -self.model.estimate(item)
+        heapq.heappush(self.queue, (key, next(self.counter), item))
+
+    def _get(self):
+        item = heapq.heappop(self.queue)[2]
+        # Unfinished tasks are queued, running or backing off before a retry
+        idle = self.workers - self.unfinished_tasks
+        if item is None or idle <= 0:
+            return item
+
+        districts = item.get('district', [])
+        parts = min(idle + 1, len(districts) // self.min_split)
+        if parts < 2:
+            return item
+
+        chunks = _chunk(districts, -(-len(districts) // parts))
+        children = [dict(item, district=chunk) for chunk in chunks]
+        # Called with the mutex held, so the extra tasks are accounted for like put() would
+        for child in children[1:]:
+            self._put(child)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+        self.splits += 1
+        print(f"Scheduler: split {len(districts)} districts into {len(children)} chunks for idle workers")
+        if self.manifest is not None:
+            self.manifest.split(item, children)
+        return children[0]
+
+def order_by_cost(queries: List[Dict], model: CostModel):
+    """
+    Returns the queries sorted longest-first.
+    """
+    return sorted(queries, key=model.estimate, reverse=True)
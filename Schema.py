@@ -0,0 +1,85 @@
+import re
+import pandas as pd
+
+# Report columns are named "<test> - <subject>|<metric>", e.g. "STAAR - Reading|Performance Levels|Masters|Count"
+COLUMN_PATTERN = re.compile(r'^(?P<test>[^|]+?) - (?P<subject>[^|]+)\|(?P<metric>.+)$')
+
+# Columns identifying a row, optional ones are missing from some reports (EOC has no Tested Grade)
+ID_COLUMNS = ['Organization', 'ID/CDC', 'Administration', 'Tested Grade', 'Student Group']
+OPTIONAL_ID_COLUMNS = ['Tested Grade']
+
+# Column order of the long/tidy table
+TIDY_COLUMNS = ID_COLUMNS + ['test', 'subject', 'metric', 'value']
+
+# Column families each kind of export produces, as patterns on the metric part of the column name
+SCHEMAS = {
+    'staar': {
+        'tests': ['STAAR', 'STAAR Alternate 2'],
+        'metrics': [r'^Tests Taken$', r'^Average Scale Score$',
+                    r'^Performance Levels\|[^|]+\|(Count|Percent)$',
+                    r'^Reporting Category[^|]*\|.+$']
+    },
+    'telpas': {
+        'tests': ['TELPAS', 'TELPAS Alternate'],
+        'metrics': [r'^(Tests Taken|Students Tested)$',
+                    r'^(Proficiency Ratings|Proficiency Levels)\|[^|]+\|(Count|Percent)$',
+                    r'^Composite Score.*$']
+    }
+}
+
+def parse_column(column):
+    """
+    Splits a column name into (test, subject, metric), or returns None for an id column.
+    """
+    match = COLUMN_PATTERN.match(column)
+    return (match['test'], match['subject'], match['metric']) if match else None
+
+def detect_schema(header):
+    """
+    Finds the schema a report follows from its header.
+
+    Args:
+        header (list[str]): Column names of the report
+
+    Returns:
+        tuple: (schema name, {column: (test, subject, metric)} for every column the schema
+            extracts), or (None, {}) when no schema matches.
+    """
+    parsed = {column: parse_column(column) for column in header}
+    best, best_columns = None, {}
+    for name, schema in SCHEMAS.items():
+        patterns = [re.compile(p) for p in schema['metrics']]
+        columns = {column: parts for column, parts in parsed.items()
+                   if parts and parts[0] in schema['tests'] and any(p.match(parts[2]) for p in patterns)}
+        if len(columns) > len(best_columns):
+            best, best_columns = name, columns
+    return best, best_columns
+
+def extract_long(df, columns):
+    """
+    Turns a wide report into one row per (org, admin, grade, group, test, subject, metric).
+
+    Args:
+        df (pd.DataFrame): The report, holding the id columns and the columns to extract
+        columns (dict): {column: (test, subject, metric)} as returned by detect_schema
+
+    Returns:
+        pd.DataFrame: The long table with TIDY_COLUMNS, values numeric with suppressed counts as NA.
+    """
+    for column in OPTIONAL_ID_COLUMNS:
+        if column not in df.columns:
+            df = df.assign(**{column: pd.NA})
+    long = df.melt(id_vars=ID_COLUMNS, value_vars=list(columns), var_name='column', value_name='value')
+
+    # Column names were parsed once in detect_schema, rows only need a dict lookup
+    for i, part in enumerate(('test', 'subject', 'metric')):
+        mapping = {column: parts[i] for column, parts in columns.items()}
+        long[part] = long['column'].map(mapping).astype('string')
+    long['value'] = pd.to_numeric(long['value'], errors='coerce')
+    return long[TIDY_COLUMNS]
+
+def subject_slug(subject):
+    """
+    File name for a subject's output, e.g. 'U.S. History' -> 'u_s_history'.
+    """
+    return re.sub(r'[^0-9a-z]+', '_', subject.lower()).strip('_')
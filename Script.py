@@ -1,122 +1,453 @@
 import os
+import re
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
+from selenium.common.exceptions import (TimeoutException, NoSuchElementException, ElementClickInterceptedException,
+                                        StaleElementReferenceException)
 import time
 import threading
 from queue import Queue
 import time
 from typing import Dict, List
+from Downloads import DownloadWatcher, DownloadStore, prepare_staging_dir, query_fingerprint
+from Manifest import Manifest
+from Tracing import Tracer, TraceSummary
+from Catalog import PROGRAMS, REPORT_ALIASES, validate_queries
+from Scheduler import CostModel, CostQueue, predict_makespan
+from Concurrency import ConcurrencyController
+from Governor import BrowserGovernor
+from Capture import ResponseCapture
+from Failures import PhaseError, RetryPolicy, FailureReport, classify, TRANSIENT, SELECTOR_BROKEN, BAD_INPUT
+
+PORTAL_URL = "https://txresearchportal.com/selections"
+
+# Browser settings used by Script.create_driver, selected by name
+BROWSER_PROFILES = {
+    # Visible browser with default loading, matches what a person sees when debugging selectors
+    "debug": {
+        "headless": False,
+        "page_load_strategy": "normal",
+        "block_resources": False,
+        "disable_animations": False,
+        "safe_browsing": True,
+        "window_size": (1920, 1080)
+    },
+    # Headless and stripped down for unattended batch runs
+    "fast": {
+        "headless": True,
+        "page_load_strategy": "eager",
+        "block_resources": True,
+        "disable_animations": True,
+        "safe_browsing": False,
+        "window_size": (1920, 1080)
+    }
+}
+
+# Requests the selections page does not need when block_resources is on
+BLOCKED_URLS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.webp", "*.ico",
+                "*.woff", "*.woff2", "*.ttf", "*.otf",
+                "*google-analytics.com*", "*googletagmanager.com*"]
+
+# Injected into every page when disable_animations is on
+NO_ANIMATIONS_CSS = "*, *::before, *::after { transition: none !important; animation: none !important; scroll-behavior: auto !important; }"
+
+# Where the portal says a search found nothing, and how it says it
+NO_RESULTS_SELECTOR = "div.MuiTableContainer-root.selections-table.selections-div, .MuiAlert-message"
+NO_RESULTS_PATTERN = r"no (results|records|matches|data)( found)?"
+
+def execute_query(options, worker, staging_dir, pool, store, manifest=None, session=None, summary=None,
+                  on_capture=None):
+    """
+    Downloads one query's report and publishes it to the store.
+
+    Shared by the thread workers and the asyncio runner. Errors are recorded in the
+    manifest and re-raised.
+
+    Args:
+        options (dict): The query
+        worker (str): Name of the calling worker, used to pick its pooled browser
+        staging_dir (str): The worker's private download directory
+        pool (DriverPool): Pool holding the worker's warm browser
+        store (DownloadStore): Store finished reports are moved into
+        manifest (Manifest, optional): Manifest recording the outcome of each query
+        session (requests.Session, optional): Session for the HTTP backend, tried before the browser
+        summary (TraceSummary, optional): Collects the query's timing trace
+        on_capture (Callable, optional): Called with the CapturedReport when the pool's browsers
+            capture reports in memory, before it is written to the store
+
+    Returns:
+        str: Path of the stored report, or None if nothing was downloaded.
+    """
+    options = dict(options, download_dir=staging_dir, capture=pool.capture)
+    if manifest:
+        manifest.start(options)
+
+    try:
+        script = None
+        if session is not None:
+            # Imported here so the default Selenium backend does not need requests
+            from HttpScript import HttpScript
+            script = HttpScript(options, session=session)
+            script.run()
+            if not script.downloaded_file:
+                print(f"{worker}: HTTP backend failed, falling back to the browser")
+                script = None
+            elif summary:
+                summary.add(script.tracer)
+
+        if script is None:
+            # Reuse this worker's warm browser for the query
+            driver = pool.acquire(worker, staging_dir)
+            failed = True
+            try:
+                script = Script(options, driver=driver)
+                script.run()
+                failed = False
+            finally:
+                pool.release(worker, failed=failed)
+                if summary and script is not None:
+                    summary.add(script.tracer)
+
+        # Publish the finished file under the query's fingerprint
+        stored = None
+        captured = getattr(script, 'captured', None)
+        if captured:
+            if on_capture:
+                on_capture(captured)
+            stored = store.put_bytes(captured.data, options)
+            print(f"{worker}: captured {len(captured.data)} bytes, stored {stored}")
+        elif script.downloaded_file:
+            stored = store.put(script.downloaded_file, options)
+            print(f"{worker}: stored {stored}")
+        if manifest:
+            manifest.finish(options, stored, None if stored else "No file downloaded")
+        return stored
+
+    except Exception as e:
+        if manifest:
+            manifest.finish(options, error=str(e))
+        raise
 
 class DownloadWorker(threading.Thread):
-    def __init__(self, task_queue: Queue, download_dir: str):
+    def __init__(self, task_queue: Queue, download_dir: str, pool: 'DriverPool', manifest: Manifest = None,
+                 session=None, summary: TraceSummary = None, retry: RetryPolicy = None,
+                 failures: FailureReport = None, controller: ConcurrencyController = None, index: int = 0,
+                 on_capture=None, on_stored=None):
         """
         Initialize a worker thread for downloading reports.
         
         Args:
             task_queue (Queue): Queue containing download tasks
             download_dir (str): Base directory for downloads
+            pool (DriverPool): Pool holding the warm browser for this worker
+            manifest (Manifest, optional): Manifest recording the outcome of each query
+            session (requests.Session, optional): Shared session for the HTTP backend. When given,
+                queries go through HttpScript first and fall back to the browser if it fails.
+            summary (TraceSummary, optional): Collects the timing trace of each query
+            retry (RetryPolicy, optional): Backoff for transient failures, defaults to RetryPolicy()
+            failures (FailureReport, optional): Collects the outcome of each query
+            controller (ConcurrencyController, optional): Parks this worker while it is above the target
+            index (int): Zero-based number of this worker, compared against the controller's target
+            on_capture (Callable, optional): Receives each CapturedReport when browsers capture in memory
+            on_stored (Callable, optional): Called with (query, path) for every stored report
         """
         threading.Thread.__init__(self)
         self.task_queue = task_queue
         self.download_dir = download_dir
+        self.pool = pool
+        self.store = DownloadStore(download_dir)
+        self.manifest = manifest
+        self.session = session
+        self.summary = summary
+        self.retry = retry or RetryPolicy()
+        self.failures = failures or FailureReport()
+        self.controller = controller
+        self.index = index
+        self.on_capture = on_capture
+        self.on_stored = on_stored
+
+    def _requeue(self, options, delay):
+        """
+        Puts a query back on the queue after a delay.
+
+        The original task is only marked done once its retry is queued, so task_queue.join()
+        keeps waiting for queries that are backing off.
+        """
+        def put():
+            self.task_queue.put(options)
+            self.task_queue.task_done()
+        timer = threading.Timer(delay, put)
+        timer.daemon = True
+        timer.start()
 
     def run(self):
-        while True:
-            try:
-                # Get task from queue
-                options = self.task_queue.get()
-                if options is None:  # Poison pill to stop thread
-                    break
-                    
-                # # Create thread-specific download directory
-                # thread_dir = os.path.join(
-                #     self.download_dir, 
-                #     f"thread_{threading.current_thread().name}"
-                # )
-                # os.makedirs(thread_dir, exist_ok=True)
-                # options['download_dir'] = thread_dir
-                
-                # Create new Script instance and run
-                script = Script(options)
+        # Private staging directory so concurrent downloads never collide
+        staging_dir = os.path.join(self.download_dir, 'staging', self.name)
+        prepare_staging_dir(staging_dir)
+
+        try:
+            while True:
                 try:
-                    script.run()
+                    # Wait while the controller has scaled below this worker, without holding a browser
+                    requeued = False
+                    if self.controller:
+                        self.controller.wait_turn(self.index, on_park=lambda: self.pool.discard(self.name))
+                    # Get task from queue
+                    options = self.task_queue.get()
+                    if options is None:  # Poison pill to stop thread
+                        break
+                    attempt = options.get('attempt', 1)
+                    fingerprint = query_fingerprint(options)
+                    try:
+                        stored = execute_query(options, self.name, staging_dir, self.pool, self.store,
+                                               self.manifest, self.session, self.summary, self.on_capture)
+                        if not stored:
+                            raise PhaseError('download', TRANSIENT, "No file downloaded")
+                        self.failures.record(fingerprint, options, 'done', attempt)
+                        if self.controller:
+                            self.controller.record(True)
+                        if self.on_stored:
+                            self.on_stored(options, stored)
+
+                    except Exception as e:
+                        kind = classify(e)
+                        if self.controller:
+                            self.controller.record(False)
+                        if self.retry.should_retry(kind, attempt):
+                            delay = self.retry.delay(attempt)
+                            print(f"{self.name}: {kind} failure ({e}), retry {attempt + 1} in {delay:.0f}s")
+                            self.failures.record(fingerprint, options, 'retrying', attempt, kind, str(e))
+                            self._requeue(dict(options, attempt=attempt + 1), delay)
+                            requeued = True
+                        else:
+                            print(f"Error in worker thread {self.name}: [{kind}] {e}")
+                            self.failures.record(fingerprint, options, 'failed', attempt, kind, str(e))
+                        
+                except Exception as e:
+                    print(f"Error in worker thread {self.name}: {e}")
                 finally:
-                    script.driver.quit()
-                    
-            except Exception as e:
-                print(f"Error in worker thread {self.name}: {e}")
-            finally:
-                self.task_queue.task_done()
+                    if not requeued:
+                        self.task_queue.task_done()
+        finally:
+            # Shut down the browser this worker kept alive
+            self.pool.discard(self.name)
+
+class DriverPool:
+    def __init__(self, max_tasks: int = 25, profile: str = "debug", governor: BrowserGovernor = None,
+                 capture: bool = False):
+        """
+        Keeps one warm WebDriver per worker so queries skip the Chrome startup.
+
+        Args:
+            max_tasks (int): Number of queries a browser serves before it is recycled
+            profile (str): Name of the BROWSER_PROFILES entry browsers are launched with
+            governor (BrowserGovernor, optional): Recycles browsers that grow too large or too old,
+                defaults to BrowserGovernor()
+            capture (bool): Launch browsers that capture reports in memory instead of downloading them
+        """
+        self.max_tasks = max_tasks
+        self.profile = profile
+        self.capture = capture
+        self.governor = governor or BrowserGovernor()
+        self.lock = threading.Lock()
+        self.slots = {}  # worker name -> [driver, tasks served]
+        self.launches = 0
+        self.launch_time = 0.0
+        self.reuses = 0
+        self.recycled = 0
+
+    def acquire(self, worker: str, download_dir: str = None):
+        """
+        Returns the warm driver for a worker, launching a new one if needed.
+
+        Args:
+            worker (str): Name of the worker thread requesting a driver
+            download_dir (str, optional): Directory a newly launched browser downloads into
+        """
+        with self.lock:
+            slot = self.slots.get(worker)
+        if slot is not None:
+            with self.lock:
+                self.reuses += 1
+            return slot[0]
+
+        start = time.perf_counter()
+        driver = Script.create_driver(download_dir, self.profile, capture=self.capture)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.slots[worker] = [driver, 0]
+            self.launches += 1
+            self.launch_time += elapsed
+        self.governor.register(worker, driver)
+        print(f"{worker}: launched browser in {elapsed:.1f}s")
+        return driver
+
+    def release(self, worker: str, failed: bool = False):
+        """
+        Returns a driver after a query, recycling it after an error or after max_tasks queries.
+
+        Args:
+            worker (str): Name of the worker thread releasing its driver
+            failed (bool): Whether the query raised an error
+        """
+        with self.lock:
+            slot = self.slots.get(worker)
+            if slot is None:
+                return
+            slot[1] += 1
+        if failed:
+            reason = "after an error"
+        elif slot[1] >= self.max_tasks:
+            reason = f"after {slot[1]} tasks"
+        else:
+            reason = self.governor.check(worker, slot[0])
+        if reason:
+            with self.lock:
+                self.recycled += 1
+            print(f"{worker}: recycling browser {reason}")
+            self.discard(worker)
+
+    def discard(self, worker: str):
+        """
+        Quits and forgets the driver held by a worker.
+
+        Args:
+            worker (str): Name of the worker thread whose driver is closed
+        """
+        with self.lock:
+            slot = self.slots.pop(worker, None)
+        if slot is None:
+            return
+        try:
+            slot[0].quit()
+        except Exception as e:
+            print(f"Error closing browser for {worker}: {e}")
+        self.governor.unregister(worker)
+
+    def close(self):
+        """
+        Quits every driver still held by the pool and kills any browser process left behind.
+        """
+        for worker in list(self.slots):
+            self.discard(worker)
+        self.governor.reap()
+
+    def report(self):
+        """
+        Prints how many browsers were launched, the startup time reuse saved and the governor's numbers.
+
+        Returns:
+            dict: The governor's report, see BrowserGovernor.report.
+        """
+        average = self.launch_time / self.launches if self.launches else 0.0
+        print(f"Browser pool: {self.launches} launches ({self.launch_time:.1f}s), "
+              f"{self.reuses} reuses, {self.recycled} recycled, "
+              f"~{average * self.reuses:.1f}s of startup saved")
+        return self.governor.report()
 
 class Script:
-    def __init__(self, options):
+    def __init__(self, options, driver=None):
         """
         Initializes the Script class with options for Selenium WebDriver.
 
         Args:
             options (dict): A dictionary containing configuration options such as download directory, district, program, and report.
+            driver (WebDriver, optional): An already running driver to reuse. A new one is launched and
+                owned by this Script when omitted.
         """
         self.options = options
+        self.download_dir = options.get('download_dir', os.path.join(os.getcwd(), 'downloads'))
+        self.download_timeout = options.get('download_timeout', 120)
+        self.download_name = None
+        self.downloaded_file = None
+        self.capture = options.get('capture', False)
+        self.captured = None
+        self.tracer = Tracer(query_fingerprint(options))
+
+        # Reuse a pooled driver when given, otherwise launch our own
+        self.owns_driver = driver is None
+        self.driver = driver if driver is not None else Script.create_driver(
+            self.download_dir, options.get('browser_profile', 'debug'), capture=self.capture)
+
+        # Map of programs to their corresponding reports and required parameters
+        self.program_report_map = PROGRAMS
+
+    @staticmethod
+    def create_driver(download_dir=None, profile="debug", capture=False):
+        """
+        Launches a Chrome WebDriver configured to download into the downloads directory.
+
+        Args:
+            download_dir (str, optional): Directory for downloaded files, defaults to ./downloads
+            profile (str or dict): Name of a BROWSER_PROFILES entry, or the settings themselves
+            capture (bool): Record network events so reports can be captured in memory
+
+        Returns:
+            WebDriver: The new Chrome driver.
+        """
+        if download_dir is None:
+            download_dir = os.path.join(os.getcwd(), 'downloads')
+        settings = BROWSER_PROFILES[profile] if isinstance(profile, str) else profile
 
         # Set up Chrome options for WebDriver
         chrome_options = webdriver.ChromeOptions()
         prefs = {
-            "download.default_directory": os.path.join(os.getcwd(), 'downloads'), # Directory for downloaded files
+            "download.default_directory": download_dir, # Directory for downloaded files
             "download.prompt_for_download": False, # Do not prompt for downloads
             "directory_upgrade": True, # Allow directory upgrades
-            "safebrowsing.enabled": True # Enable safe browsing
+            "safebrowsing.enabled": settings["safe_browsing"] # Scan downloads with safe browsing
         }
+        if settings["block_resources"]:
+            prefs["profile.managed_default_content_settings.images"] = 2 # Do not load images
         chrome_options.add_experimental_option("prefs", prefs)
-        self.driver = webdriver.Chrome(options=chrome_options)
 
-        # Map of programs to their corresponding reports and required parameters
-        self.program_report_map = {
-            "STAAR 3-8": {
-                "Standard Constructed Response Summary": ['administration', 'grade', 'version'],
-                "Standard Combined Summary": ['administration', 'subject', 'grade'],
-                "Group Summary: Performance Levels & Reporting Categories": ['administration', 'subject', 'grade'],
-                "Standard Summary": ['administration', 'subject', 'version', 'grade'],
-                "Item Analysis Summary": ['administration', 'grade', 'subject', 'version'],
-                "Score Codes Summary": ['administration', 'grade', 'subject']
-            },
-            "STAAR 3-8 Alternate 2 3-8": {
-                'Group Summary': ['administration', 'grade', 'subject'],
-                'Score Codes Summary': ['administration', 'grade', 'subject'],
-                'Standard Summary': ['administration', 'grade', 'subject'],
-            },
-            'STAAR Alternate 2 EOC': {
-                'Group Summary: Performance Levels': ['administration', 'subject'],
-                'Score Codes Summary':['administration', 'subject'],
-                'Standard Summary':['administration', 'subject']
-            },
-            'STAAR Cumulative': {
-                'Standard Cummulative Summary': ['administration', 'grade', 'subject']
-            },
-            'STAAR EOC': {
-                'Group Summary: Performance Levels & Reporting Categories': ['administration', 'subject'],
-                'Standard Combined Summary': ['administration', 'subject'],
-                'Item Analysis Summary': ['administration', 'subject'],
-                'Score Codes Summary': ['administration', 'subject'],
-                'Standard Constructed Response Summary': ['administration', 'subject', 'version'],
-                'Standard Summary': ['administration', 'subject', 'version']
-            },
-            'TELPAS': {
-                'Cluster Summary': ['administration', 'subject', 'cluster'],
-                'Standard Summary For Grade': ['administration', 'grade'],
-                'Group Summary: Performance Levels': ['administration', 'subject', 'grade'],
-                'Score Codes Summary': ['administration', 'grade', 'subject'],
-                'Standard Summary For Cluster': ['administration', 'cluster']
-            },
-            'TELPAS Alternate': {
-                'Group Summary: Performance Levels': ['administration', 'subject', 'grade'],
-                'Score Codes Summary': ['administration', 'grade'],
-                'Standard Summary': ['administration', 'grade']
-            }
-        }
+        chrome_options.page_load_strategy = settings["page_load_strategy"]
+        width, height = settings["window_size"]
+        chrome_options.add_argument(f"--window-size={width},{height}")
+        if settings["headless"]:
+            chrome_options.add_argument("--headless=new")
+            chrome_options.add_argument("--disable-gpu")
+        if not settings["safe_browsing"]:
+            chrome_options.add_argument("--safebrowsing-disable-download-protection")
+        if settings["disable_animations"]:
+            chrome_options.add_argument("--force-prefers-reduced-motion")
+        if settings["block_resources"]:
+            for arg in ("--disable-extensions", "--no-first-run", "--mute-audio",
+                        "--disable-background-networking", "--disable-component-update"):
+                chrome_options.add_argument(arg)
+        if capture:
+            # Network events are read back by ResponseCapture
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+        driver = webdriver.Chrome(options=chrome_options)
+
+        # Fonts and trackers can only be blocked once the browser is up
+        if settings["block_resources"]:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+        if settings["disable_animations"]:
+            driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": (
+                "document.addEventListener('DOMContentLoaded', () => {"
+                "const style = document.createElement('style');"
+                f"style.textContent = {NO_ANIMATIONS_CSS!r};"
+                "document.head.appendChild(style); });"
+            )})
+        return driver
+
+    def reset(self):
+        """
+        Returns the browser to a clean selections page so a warm driver can serve the next query.
+        """
+        try:
+            # Drop selections the portal may have persisted from the previous query
+            self.driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except Exception:
+            pass  # Nothing to clear on a blank page
+        portal_url = self.options.get('portal_url', PORTAL_URL)
+        self.driver.get(portal_url)
+        print(f"Navigation to {portal_url} successful.")
 
     def run(self):
         
@@ -126,31 +457,63 @@ class Script:
         This includes navigating to the website, selecting district, program, and report,
         handling dynamic parameters, and initiating the download.
         """
+        trace = self.tracer.span
         try:
-            # Navigate to the website
-            self.driver.get("https://txresearchportal.com/selections")
-            print("Navigation to https://txresearchportal.com/selections successful.")
+            # Navigate to a clean selections page
+            with trace('reset'):
+                self.reset()
 
             # Dynamically select based on user-provided options
-            self.select_district(self.options['district'])
-            self.select_program(self.options['program'])
+            with trace('select_district'):
+                self.select_district(self.options['district'])
+            with trace('select_program'):
+                self.select_program(self.options['program'])
             
             # Dynamically select report based on options
-            self.select_report(self.options['report'])
+            with trace('select_report'):
+                self.select_report(self.options['report'])
             
             # Dynamically handle parameters based on the selected report
-            self.handle_dynamic_parameters(self.options['report'], self.options['program'], self.options)
+            with trace('handle_dynamic_parameters'):
+                self.handle_dynamic_parameters(self.options['report'], self.options['program'], self.options)
 
             # Apply filters
-            self.apply_filters()
+            with trace('apply_filters'):
+                self.apply_filters()
 
-            # Trigger the download process
-            self.download(self.options['district'], self.options['administration'])
+            if self.capture:
+                # Take the report off the network instead of waiting for Chrome to save it
+                capture = ResponseCapture(self.driver)
+                capture.start()
+                try:
+                    with trace('download'):
+                        self.download(self.options['district'], self.options['administration'])
+                    with trace('capture'):
+                        self.captured = capture.wait(self.options, timeout=self.download_timeout)
+                finally:
+                    capture.stop(self.download_dir)
+                if not self.captured:
+                    raise PhaseError('capture', TRANSIENT, f"no export response after {self.download_timeout}s")
+                print(f"Capture complete: {len(self.captured.data)} bytes")
+                return
+
+            # Trigger the download process and wait for the file to finish
+            watcher = DownloadWatcher(self.download_dir)
+            before = watcher.snapshot()
+            with trace('download'):
+                self.download(self.options['district'], self.options['administration'])
+            with trace('wait_for_download'):
+                self.downloaded_file = watcher.wait_for_download(
+                    before, self.download_name, timeout=self.download_timeout)
+            if not self.downloaded_file:
+                raise PhaseError('wait_for_download', TRANSIENT,
+                                 f"no file after {self.download_timeout}s")
+            print(f"Download complete: {self.downloaded_file}")
 
         finally:
-            # Ensure the browser is closed after the operation
-            time.sleep(5)  # Wait for the download to complete
-            self.driver.quit()
+            # Pooled drivers are closed by their pool, only quit a driver we launched
+            if self.owns_driver:
+                self.driver.quit()
 
     def handle_dynamic_parameters(self, report, program, options):
         """
@@ -161,38 +524,67 @@ class Script:
             program (str): The selected program.
             options (dict): The options containing parameter values.
         """
-        if program in self.program_report_map and report in self.program_report_map[program]:
-            required_params = self.program_report_map[program][report]
+        report = REPORT_ALIASES.get(report, report)
+        if program not in self.program_report_map or report not in self.program_report_map[program]:
+            raise PhaseError('handle_dynamic_parameters', BAD_INPUT, f"unknown report '{report}' for '{program}'")
 
-            # Iterate through required parameters and invoke respective selection methods
-            for param in required_params:
+        required_params = self.program_report_map[program][report]
 
-                if param in options:
-                    method = getattr(self, f"select_{param}", None) # Call the selection method with the option value
+        # Iterate through required parameters and invoke respective selection methods
+        for param in required_params:
 
-                    if method:
-                        method(options[param])
-                    else:
-                        print(f"Selection method for {param} not defined.")
+            if param in options:
+                method = getattr(self, f"select_{param}", None) # Call the selection method with the option value
+
+                if method:
+                    method(options[param])
                 else:
-                    print(f"Parameter {param} not provided for {program}.")
+                    print(f"Selection method for {param} not defined.")
+            else:
+                raise PhaseError('handle_dynamic_parameters', BAD_INPUT,
+                                 f"parameter {param} not provided for {program}")
 
     def select_district(self, district):
         """
-        Selects the specified district by calling the helper _search function.
+        Selects the specified districts.
+
+        By default all districts are selected by one in-page script (see _bulk_search).
+        Districts it could not select, or every district when options['district_mode'] is
+        'sequential', go through the per-district _search round trip.
+
         Args:
             district (list[str]): The names of the districts to select.
         """
+        timings = []
+        remaining = list(district)
+        not_found = set()  # Districts the portal explicitly found nothing for
+        search_again = False
+
+        if self.options.get('district_mode', 'bulk') == 'bulk' and remaining:
+            try:
+                with self.tracer.span('_bulk_search', 'step', districts=len(remaining)):
+                    results = self._bulk_search(remaining)
+                timings.extend((r['district'], r['seconds'], 'bulk', r['ok']) for r in results)
+                not_found.update(r['district'] for r in results if r['no_match'])
+                # A search the portal answered with no results is not worth repeating one by one
+                remaining = [r['district'] for r in results if not r['ok'] and not r['no_match']]
+                search_again = any(r['ok'] for r in results)
+                for r in results:
+                    if not r['ok']:
+                        print(f"Bulk selection failed for '{r['district']}': {r['error']}")
+            except Exception as e:
+                print(f"Bulk district selection failed, falling back to one search per district: {e}")
+
         try:
-            search_again = False
-            for dis in district:
+            for dis in remaining:
+                start = time.perf_counter()
                 try:
                     print(f"\nProcessing district: {dis}")
                     
                     # If not the first district, click the new search button
                     if search_again:
                         print("Clicking new search button to return to search page...")
-                        new_search_button = WebDriverWait(self.driver, 10).until(
+                        new_search_button = self.tracer.wait(self.driver, 10).until(
                             EC.element_to_be_clickable((By.CSS_SELECTOR, 
                                 "div.MuiGrid-container button.MuiLink-button[aria-label='Search Again']"))
                         )
@@ -200,27 +592,154 @@ class Script:
                         # Scroll parent div into view first
                         parent_div = self.driver.find_element(By.CSS_SELECTOR, "div.MuiGrid-container")
                         self.driver.execute_script("arguments[0].scrollIntoView(true);", parent_div)
-                        time.sleep(1)
+                        self.tracer.sleep(1)
                         new_search_button.click()
-                        time.sleep(2)  # Wait for page to load
+                        self.tracer.sleep(2)  # Wait for page to load
                     
                     # Search for and select the current district
-                    self._search(dis)
+                    with self.tracer.span('_search', 'step', district=dis):
+                        self._search(dis)
                     search_again = True
+                    timings.append((dis, time.perf_counter() - start, 'search', True))
                     
                 except Exception as e:
                     print(f"Error processing district '{dis}': {str(e)}")
+                    timings.append((dis, time.perf_counter() - start, 'search', False))
+                    if classify(e) == BAD_INPUT:
+                        not_found.add(dis)
                     # Continue with next district even if current one fails
                     continue
             
-            print("All districts processed successfully.")
-
         except Exception as e:
             print(f"An unexpected error occurred while processing districts: {str(e)}")
             print("Last known action: " + self.driver.current_url)
-
+            raise PhaseError('select_district', classify(e), str(e)) from e
+
+        self._print_district_timings(timings)
+
+        # A report missing some districts is worse than a retry
+        selected = {dis for dis, _, _, ok in timings if ok}
+        failed = [dis for dis in district if dis not in selected]
+        if failed:
+            missing = [dis for dis in failed if dis in not_found]
+            if missing:
+                # A mistyped or retired code stays unknown however often the query is retried
+                raise PhaseError('select_district', BAD_INPUT, f"no match for {', '.join(missing)}")
+            raise PhaseError('select_district', TRANSIENT, f"could not select {', '.join(failed)}")
         print("District selection completed.")
 
+    def _bulk_search(self, districts, per_district_timeout=15):
+        """
+        Selects many districts with a single asynchronous script running inside the page.
+
+        The script types each CDC code with React's native value setter, submits the search,
+        waits for a result row listing the searched name or code, ticks its checkbox and clicks
+        "Search Again", without a WebDriver round trip or fixed sleep between districts.
+        The driver's script timeout is raised for the call and restored afterwards, so a
+        pooled browser does not keep it for later queries.
+
+        Args:
+            districts (list[str]): The names or CDC codes of the districts to select.
+            per_district_timeout (int): Seconds allowed per district before the script gives up on it.
+
+        Returns:
+            list[dict]: One entry per district with 'district', 'ok', 'seconds', 'error' and
+                'no_match', True when the portal answered the search with no results.
+        """
+        script = """
+        const districts = arguments[0];
+        const timeoutMs = arguments[1];
+        const noResults = new RegExp(arguments[2], 'i');
+        const noResultsSelector = arguments[3];
+        const done = arguments[arguments.length - 1];
+        const tableSelector = 'div.MuiTableContainer-root.selections-table.selections-div';
+        const inputSelector = "input[placeholder='Enter a Campus or District Name or CDC code']";
+        const buttonSelector = "button.MuiButton-containedInherit[type='submit']";
+        const againSelector = "div.MuiGrid-container button.MuiLink-button[aria-label='Search Again']";
+        const checkboxSelector = "input.PrivateSwitchBase-input[type='checkbox']";
+        const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+
+        // Resolves with the first truthy value of find(), polling on animation frames
+        const waitFor = (find, deadline) => new Promise((resolve, reject) => {
+            const poll = () => {
+                const found = find();
+                if (found) return resolve(found);
+                if (performance.now() > deadline) return reject(new Error('timed out'));
+                requestAnimationFrame(poll);
+            };
+            poll();
+        });
+
+        (async () => {
+            const results = [];
+            for (const district of districts) {
+                const start = performance.now();
+                const deadline = start + timeoutMs;
+                try {
+                    const again = document.querySelector(againSelector);
+                    if (again) again.click();
+
+                    const input = await waitFor(() => document.querySelector(inputSelector), deadline);
+                    setter.call(input, district);
+                    input.dispatchEvent(new Event('input', { bubbles: true }));
+                    const button = await waitFor(() => {
+                        const b = document.querySelector(buttonSelector);
+                        return b && !b.disabled ? b : null;
+                    }, deadline);
+                    button.click();
+
+                    // Only rows of this search list the searched code, rows left by the previous district do not
+                    const needle = district.trim().toLowerCase();
+                    const found = await waitFor(() => {
+                        const table = document.querySelector(tableSelector);
+                        const row = table && Array.from(table.querySelectorAll('tr')).find(
+                            r => r.querySelector(checkboxSelector) && r.textContent.toLowerCase().includes(needle));
+                        if (row) return {checkbox: row.querySelector(checkboxSelector)};
+                        const empty = Array.from(document.querySelectorAll(noResultsSelector)).some(
+                            el => noResults.test(el.textContent));
+                        return empty ? {noMatch: true} : null;
+                    }, deadline);
+                    if (found.noMatch) {
+                        results.push({district, ok: false, ms: performance.now() - start,
+                                      error: 'no results', noMatch: true});
+                        continue;
+                    }
+                    if (!found.checkbox.checked) found.checkbox.click();
+                    results.push({district, ok: true, ms: performance.now() - start, error: null, noMatch: false});
+                } catch (e) {
+                    results.push({district, ok: false, ms: performance.now() - start, error: String(e), noMatch: false});
+                }
+            }
+            done(results);
+        })();
+        """
+        previous = self.driver.timeouts.script
+        self.driver.set_script_timeout(per_district_timeout * len(districts) + 10)
+        try:
+            results = self.driver.execute_async_script(script, districts, per_district_timeout * 1000,
+                                                       NO_RESULTS_PATTERN, NO_RESULTS_SELECTOR)
+        finally:
+            self.driver.set_script_timeout(previous)
+        for r in results:
+            r['seconds'] = r.pop('ms') / 1000
+            r['no_match'] = bool(r.pop('noMatch', False))
+        return results
+
+    def _print_district_timings(self, timings):
+        """
+        Prints how long each district took to select and through which path.
+
+        Args:
+            timings (list[tuple]): (district, seconds, path, ok) for each district
+        """
+        if not timings:
+            return
+        print("\nDistrict selection timings:")
+        for dis, seconds, path, ok in timings:
+            print(f"  {dis:<12} {seconds:6.2f}s  {path:<6} {'ok' if ok else 'FAILED'}")
+        total = sum(t[1] for t in timings)
+        print(f"  Total {total:.2f}s for {len(timings)} districts ({total / len(timings):.2f}s avg)")
+
     def _search(self, dis):
         """
         Selects the specified district by typing the name, clicking search, and selecting the first checkbox in the results table.
@@ -229,7 +748,7 @@ class Script:
         """
         # Locate and clear the search input
         print("Locating search input...")
-        search_input = WebDriverWait(self.driver, 10).until(
+        search_input = self.tracer.wait(self.driver, 10).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "input[placeholder='Enter a Campus or District Name or CDC code']"))
         )
         search_input.clear()
@@ -238,38 +757,45 @@ class Script:
         # Type the district name
         search_input.send_keys(dis)
         print(f"Typed district name: {dis}")
-        time.sleep(1)  # Short pause after typing
+        self.tracer.sleep(1)  # Short pause after typing
         
         # Click the search button
         print("Locating search button...")
         search_button_selector = ("button.MuiButtonBase-root.MuiButton-root.MuiButton-contained.MuiButton-containedInherit."
                                 "MuiButton-sizeMedium.MuiButton-containedSizeMedium.MuiButton-colorInherit[type='submit']")
-        search_button = WebDriverWait(self.driver, 10).until(
+        search_button = self.tracer.wait(self.driver, 10).until(
             EC.element_to_be_clickable((By.CSS_SELECTOR, search_button_selector))
         )
         print("Search button found. Attempting to click...")
         search_button.click()
         print("Search button clicked.")
         
-        # Wait for the results table to appear
+        # Wait for the results table, or the portal saying there are no results
         print("Waiting for results table...")
         table_selector = "div.MuiTableContainer-root.selections-table.selections-div"
-        WebDriverWait(self.driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, table_selector))
-        )
+        checkbox_selector = f"{table_selector} input.PrivateSwitchBase-input[type='checkbox']"
+        def results_or_empty(driver):
+            if driver.find_elements(By.CSS_SELECTOR, checkbox_selector):
+                return 'results'
+            if any(re.search(NO_RESULTS_PATTERN, el.text, re.IGNORECASE)
+                   for el in driver.find_elements(By.CSS_SELECTOR, NO_RESULTS_SELECTOR)):
+                return 'empty'
+            return False
+        wait = self.tracer.wait(self.driver, 10, ignored_exceptions=(StaleElementReferenceException,))
+        if wait.until(results_or_empty) == 'empty':
+            raise PhaseError('select_district', BAD_INPUT, f"no match for '{dis}'")
         print("Results table found.")
         
         # Find the first checkbox within the results table
         print("Locating first checkbox in results...")
-        checkbox_selector = f"{table_selector} input.PrivateSwitchBase-input[type='checkbox']"
-        checkbox = WebDriverWait(self.driver, 10).until(
+        checkbox = self.tracer.wait(self.driver, 10).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, checkbox_selector))
         )
         print("First checkbox found. Scrolling into view...")
         
         # Scroll the checkbox into view
         self.driver.execute_script("arguments[0].scrollIntoView(true);", checkbox)
-        time.sleep(1)  # Wait for the scroll to complete
+        self.tracer.sleep(1)  # Wait for the scroll to complete
         
         # Click the checkbox
         print("Attempting to click checkbox...")
@@ -279,16 +805,16 @@ class Script:
     def select_program(self, program):
         try:
             # Find the 'Select the Program' section 
-            program_section = WebDriverWait(self.driver, 10).until(
+            program_section = self.tracer.wait(self.driver, 10).until(
                 EC.presence_of_element_located((By.XPATH, "//h4[contains(text(), 'Select the Program')]"))
             )
             
             # Scroll the 'Select the Program' section into view
             self.driver.execute_script("arguments[0].scrollIntoView(true);", program_section)
-            time.sleep(1)  # Wait for the scroll to complete
+            self.tracer.sleep(1)  # Wait for the scroll to complete
 
             # Select programs' main grid
-            main_container = WebDriverWait(self.driver, 10).until(
+            main_container = self.tracer.wait(self.driver, 10).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "div.MuiGrid-root.MuiGrid-container.MuiGrid-spacing-xs-3"))
             )
 
@@ -298,6 +824,7 @@ class Script:
             print(f"Selected program: {program} successfully")
         except Exception as e:
             print(f"Error selecting program: {e}")
+            raise PhaseError('select_program', classify(e), str(e)) from e
 
     def select_report(self, report):
         """
@@ -308,23 +835,23 @@ class Script:
         """
         try:
             # Wait for the report container to be present
-            report_container = WebDriverWait(self.driver, 20).until(
+            report_container = self.tracer.wait(self.driver, 20).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "div.MuiContainer-root.MuiContainer-maxWidthLg"))
             )
 
             # Scroll the container into view
             self.driver.execute_script("arguments[0].scrollIntoView(true);", report_container)
-            time.sleep(2)  # Wait for any animations to complete
+            self.tracer.sleep(2)  # Wait for any animations to complete
 
             try:
                 # Method 1: Using XPath
-                radio_label = WebDriverWait(self.driver, 10).until(
+                radio_label = self.tracer.wait(self.driver, 10).until(
                     EC.element_to_be_clickable((By.XPATH, f"//label[contains(@class, 'MuiFormControlLabel-root') and contains(., '{report}')]"))
                 )
             except:
                 print("XPath method failed, trying CSS selector")
                 # Method 2: Using CSS selector
-                radio_label = WebDriverWait(self.driver, 10).until(
+                radio_label = self.tracer.wait(self.driver, 10).until(
                     EC.element_to_be_clickable((By.CSS_SELECTOR, f"label.MuiFormControlLabel-root:contains('{report}')"))
                 )
 
@@ -334,6 +861,7 @@ class Script:
 
         except Exception as e:
             print(f"Error selecting report '{report}': {str(e)}")
+            raise PhaseError('select_report', classify(e), str(e)) from e
 
     def select_administration(self, administrations):
         """
@@ -342,53 +870,7 @@ class Script:
         Args:
             administration (str): The administration value to select.
         """
-        try:
-            # Find the 'Select the Administrations' section
-            administrations_section = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//h4[contains(text(), 'Select the Administration')]"))
-            )
-            
-            # Scroll the 'Select the Administrations' section into view
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", administrations_section)
-            time.sleep(2)  # Wait for the scroll to complete and any dynamic content to load
-
-            # Select administrations' main container
-            administrations_container = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div.MuiContainer-root.MuiContainer-maxWidthLg"))
-            )
-
-            for administration in administrations:
-                try:
-                    # Wait for the specific administration option to be clickable
-                    admin_option = WebDriverWait(self.driver, 10).until(
-                        EC.element_to_be_clickable((By.XPATH, f"//label[contains(@class, 'MuiFormControlLabel-root') and contains(., '{administration}')]"))
-                    )
-                    
-                    # Check if it's a checkbox or radio button
-                    input_element = admin_option.find_element(By.CSS_SELECTOR, "input")
-                    input_type = input_element.get_attribute("type")
-                    
-                    if input_type == "checkbox":
-                        # For checkboxes, only click if not already checked
-                        if not input_element.is_selected():
-                            admin_option.click()
-                            time.sleep(1)
-                    elif input_type == "radio":
-                        # For radio buttons, always click to ensure selection
-                        admin_option.click()
-                        time.sleep(1)
-                    else:
-                        print(f"Unexpected input type for {administration}: {input_type}")
-                        continue
-
-                    print(f"Selected administration: {administration} successfully")
-                    time.sleep(1)  # Wait for any potential updates after selection
-                    
-                except Exception as e:
-                    print(f"Error selecting {administration}")
-                    
-        except Exception as e:
-            print(f"Error in select_administrations: {str(e)}")
+        return self._select_options("Select the Administration", administrations, "administration")
 
     def select_grade(self, grades):
         """
@@ -397,53 +879,91 @@ class Script:
         Args:
             grade (str): The grade value to select.
         """
+        return self._select_options("Select the Administration", grades, "grade")
+
+    def _select_options(self, heading, labels, kind, timeout=10):
+        """
+        Selects every requested option of a section with a single in-page script per attempt.
+
+        The script finds each label after the section heading, ticks checkboxes that are not
+        yet checked and clicks radios. Labels the page has not rendered yet are retried
+        until the timeout.
+
+        Args:
+            heading (str): Text of the section's h4 heading.
+            labels (list[str]): The option labels to select.
+            kind (str): Name of the option type, used in log messages.
+            timeout (int): Seconds to wait for the section and its labels.
+
+        Returns:
+            dict: Label -> 'selected', 'already_checked' or 'missing'.
+        """
+        script = """
+        const heading = arguments[0];
+        const labels = arguments[1];
+        const section = Array.from(document.querySelectorAll('h4'))
+            .find(h => h.textContent.includes(heading));
+        let candidates = Array.from(document.querySelectorAll('label.MuiFormControlLabel-root'));
+        if (section) {
+            section.scrollIntoView(true);
+            const following = candidates.filter(
+                l => section.compareDocumentPosition(l) & Node.DOCUMENT_POSITION_FOLLOWING);
+            if (following.length) candidates = following;
+        }
+
+        const status = {};
+        for (const label of labels) {
+            const text = l => l.textContent.trim();
+            const match = candidates.find(l => text(l) === label)
+                || candidates.find(l => text(l).includes(label));
+            const input = match && match.querySelector('input');
+            if (!input) {
+                status[label] = 'missing';
+            } else if (input.type === 'checkbox' && input.checked) {
+                status[label] = 'already_checked';
+            } else {
+                match.click();
+                status[label] = 'selected';
+            }
+        }
+        return status;
+        """
+        status = {label: 'missing' for label in labels}
         try:
-            # Find the 'Select the Grades' section
-            grade_section = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//h4[contains(text(), 'Select the Administration')]"))
+            self.tracer.wait(self.driver, timeout).until(
+                EC.presence_of_element_located((By.XPATH, f"//h4[contains(text(), '{heading}')]"))
             )
+        except Exception as e:
+            print(f"Error in select_{kind}: section '{heading}' not found")
+            raise PhaseError(f'select_{kind}', classify(e), f"section '{heading}' not found") from e
 
-            # Scroll the 'Select the Grades' section into view
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", grade_section)
-            time.sleep(2)  # Wait for the scroll to complete and any dynamic content to load
+        try:
 
-            # Select Grades' main container
-            grades_container = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div.MuiContainer-root.MuiContainer-maxWidthLg"))
-            )
+            # Re-run for labels that were not rendered yet until all are found or time runs out
+            def resolve(driver):
+                missing = [label for label, state in status.items() if state == 'missing']
+                status.update(driver.execute_script(script, heading, missing))
+                return all(state != 'missing' for state in status.values())
 
-            for grade in grades:
-                try:
-                    # Wait for the specific grade option to be clickable
-                    admin_option = WebDriverWait(self.driver, 10).until(
-                        EC.element_to_be_clickable((By.XPATH, f"//label[contains(@class, 'MuiFormControlLabel-root') and contains(., '{grade}')]"))
-                    )
-                    
-                    # Check if it's a checkbox or radio button
-                    input_element = admin_option.find_element(By.CSS_SELECTOR, "input")
-                    input_type = input_element.get_attribute("type")
-                    
-                    if input_type == "checkbox":
-                        # For checkboxes, only click if not already checked
-                        if not input_element.is_selected():
-                            admin_option.click()
-                            time.sleep(1)
-                    elif input_type == "radio":
-                        # For radio buttons, always click to ensure selection
-                        admin_option.click()
-                        time.sleep(1)
-                    else:
-                        print(f"Unexpected input type for {grade}: {input_type}")
-                        continue
-
-                    print(f"Selected administration: {grade} successfully")
-                    time.sleep(1)  # Wait for any potential updates after selection
-                    
-                except Exception as e:
-                    print(f"Error selecting {grade}")
-                    
+            with self.tracer.span(f'select_{kind}', 'step', labels=len(labels)):
+                self.tracer.wait(self.driver, timeout, poll_frequency=0.25).until(resolve)
+        except TimeoutException:
+            pass
         except Exception as e:
-            print(f"Error in select_administrations: {str(e)}")
+            print(f"Error in select_{kind}: {str(e)}")
+            raise PhaseError(f'select_{kind}', classify(e), str(e)) from e
+
+        for label, state in status.items():
+            if state == 'missing':
+                print(f"Error selecting {label}")
+            else:
+                print(f"Selected {kind}: {label} successfully ({state})")
+
+        # The section rendered but does not offer these values
+        missing = [label for label, state in status.items() if state == 'missing']
+        if missing:
+            raise PhaseError(f'select_{kind}', BAD_INPUT, f"options not offered: {', '.join(missing)}")
+        return status
 
     # DOES NOT WORK WITH 'STAAR' AS OF NOWS
     def select_version(self, version):
@@ -455,22 +975,22 @@ class Script:
         """
         try:
             # Find the 'Select the Administrations' section
-            version_section = WebDriverWait(self.driver, 10).until(
+            version_section = self.tracer.wait(self.driver, 10).until(
                 EC.presence_of_element_located((By.XPATH, "//h4[contains(text(), 'Select a Version')]"))
             )
 
             # Scroll the 'Select the Version' section into view
             self.driver.execute_script("arguments[0].scrollIntoView(true);", version_section)
-            time.sleep(2)  # Wait for the scroll to complete and any dynamic content to load
+            self.tracer.sleep(2)  # Wait for the scroll to complete and any dynamic content to load
 
             # Select versions' main container
-            version_container = WebDriverWait(self.driver, 10).until(
+            version_container = self.tracer.wait(self.driver, 10).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "div.MuiContainer-root.MuiContainer-maxWidthLg"))
             )
 
             try:
                 # Wait for the specific version option to be clickable
-                version_option = WebDriverWait(self.driver, 10).until(
+                version_option = self.tracer.wait(self.driver, 10).until(
                     EC.element_to_be_clickable((By.XPATH, f"//label[contains(@class, 'MuiFormControlLabel-root') and contains(., '{version}')]"))
                 )
                 
@@ -478,13 +998,17 @@ class Script:
                 version_option.click()
 
                 print(f"Selected {version} successfully")
-                time.sleep(1)  # Wait for any potential updates after selection
+                self.tracer.sleep(1)  # Wait for any potential updates after selection
                 
             except Exception as e:
                 print(f"Error selecting {version}: {str(e)}")
+                raise PhaseError('select_version', BAD_INPUT, f"version '{version}' not offered") from e
                     
+        except PhaseError:
+            raise
         except Exception as e:
             print(f"Error in select_version: {str(e)}")
+            raise PhaseError('select_version', classify(e), str(e)) from e
 
     def select_subject(self, subjects):
         """
@@ -493,54 +1017,7 @@ class Script:
         Args:
             subject (str): The version subject to select.
         """
-        try:
-            # Find the 'Select the Grades' section
-            subject_section = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//h4[contains(text(), 'Select a Subject')]"))
-            )
-
-            # Scroll the 'Select the Grades' section into view
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", subject_section)
-            time.sleep(2)  # Wait for the scroll to complete and any dynamic content to load
-
-            # Select Grades' main container
-            subject_cointainer = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div.MuiContainer-root.MuiContainer-maxWidthLg"))
-            )
-
-            for subject in subjects:
-                try:
-                    # Wait for the specific grade option to be clickable
-                    admin_option = WebDriverWait(self.driver, 10).until(
-                        EC.element_to_be_clickable((By.XPATH, f"//label[contains(@class, 'MuiFormControlLabel-root') and contains(., '{subject}')]"))
-                    )
-                    
-                    # Check if it's a checkbox or radio button
-                    input_element = admin_option.find_element(By.CSS_SELECTOR, "input")
-                    input_type = input_element.get_attribute("type")
-                    
-                    if input_type == "checkbox":
-                        # For checkboxes, only click if not already checked
-                        if not input_element.is_selected():
-                            admin_option.click()
-                            time.sleep(1)
-                    elif input_type == "radio":
-                        # For radio buttons, always click to ensure selection
-                        admin_option.click()
-                        time.sleep(1)
-                    else:
-                        print(f"Unexpected input type for {subject}: {input_type}")
-                        continue
-
-                    print(f"Selected subject: {subject} successfully")
-                    time.sleep(1)  # Wait for any potential updates after selection
-                    
-                except Exception as e:
-                    print(f"Error selecting {subject}")
-                    
-        except Exception as e:
-            print(f"Error in select_administrations: {str(e)}")
-
+        return self._select_options("Select a Subject", subjects, "subject")
 
     def select_cluster(self, clusters):
         """
@@ -549,53 +1026,7 @@ class Script:
         Args:
             subject (str): The cluster value to select.
         """
-        try:
-            # Find the 'Select the Cluster' section
-            cluster_section = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//h4[contains(text(), 'Select a Subject')]"))
-            )
-
-            # Scroll the 'Select the Cluster' section into view
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", cluster_section)
-            time.sleep(2)  # Wait for the scroll to complete and any dynamic content to load
-
-            # Select Grades' main container
-            subject_cointainer = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div.MuiContainer-root.MuiContainer-maxWidthLg"))
-            )
-
-            for cluster in clusters:
-                try:
-                    # Wait for the specific Cluster option to be clickable
-                    admin_option = WebDriverWait(self.driver, 10).until(
-                        EC.element_to_be_clickable((By.XPATH, f"//label[contains(@class, 'MuiFormControlLabel-root') and contains(., '{cluster}')]"))
-                    )
-                    
-                    # Check if it's a checkbox or radio button
-                    input_element = admin_option.find_element(By.CSS_SELECTOR, "input")
-                    input_type = input_element.get_attribute("type")
-                    
-                    if input_type == "checkbox":
-                        # For checkboxes, only click if not already checked
-                        if not input_element.is_selected():
-                            admin_option.click()
-                            time.sleep(1)
-                    elif input_type == "radio":
-                        # For radio buttons, always click to ensure selection
-                        admin_option.click()
-                        time.sleep(1)
-                    else:
-                        print(f"Unexpected input type for {cluster}: {input_type}")
-                        continue
-
-                    print(f"Selected cluster: {cluster} successfully")
-                    time.sleep(1)  # Wait for any potential updates after selection
-                    
-                except Exception as e:
-                    print(f"Error selecting {cluster}")
-                    
-        except Exception as e:
-            print(f"Error in select_clusters: {str(e)}")
+        return self._select_options("Select a Subject", clusters, "cluster")
 
     def apply_filters(self):
         """
@@ -603,44 +1034,45 @@ class Script:
         """
         try:
             # Find the View Selections button using the ID
-            view_selections = WebDriverWait(self.driver, 10).until(
+            view_selections = self.tracer.wait(self.driver, 10).until(
                 EC.element_to_be_clickable((By.ID, "selectionsSubmitButton"))
             )
             view_selections.click()
 
             # Wait and click the Breakdown button
-            breakdown_button = WebDriverWait(self.driver, 10).until(
+            breakdown_button = self.tracer.wait(self.driver, 10).until(
                 EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Breakdown')]"))
             )
             breakdown_button.click()
 
             # Wait for dialog to be visible and find checkboxes by their label text
-            WebDriverWait(self.driver, 10).until(
+            self.tracer.wait(self.driver, 10).until(
                 EC.presence_of_element_located((By.XPATH, "//div[contains(text(), 'Breakdown by Demographic')]"))
             )
 
             # Find and click Ethnicity checkbox
-            ethnicity_checkbox = WebDriverWait(self.driver, 10).until(
+            ethnicity_checkbox = self.tracer.wait(self.driver, 10).until(
                 EC.element_to_be_clickable((By.XPATH, "//label[normalize-space()='Ethnicity']/input[@type='checkbox'] | //label[normalize-space()='Ethnicity']"))
             )
             if not ethnicity_checkbox.is_selected():
                 ethnicity_checkbox.click()
 
             # Find and click Economically Disadvantaged checkbox
-            econ_checkbox = WebDriverWait(self.driver, 10).until(
+            econ_checkbox = self.tracer.wait(self.driver, 10).until(
                 EC.element_to_be_clickable((By.XPATH, "//label[normalize-space()='Economically Disadvantaged']/input[@type='checkbox'] | //label[normalize-space()='Economically Disadvantaged']"))
             )
             if not econ_checkbox.is_selected():
                 econ_checkbox.click()
 
             # Click the Apply button
-            apply_button = WebDriverWait(self.driver, 10).until(
+            apply_button = self.tracer.wait(self.driver, 10).until(
                 EC.element_to_be_clickable((By.XPATH, "//button[text()='Apply']"))
             )
             apply_button.click()
 
         except Exception as e:
             print(f"Error applying filters: {e}")
+            raise PhaseError('apply_filters', classify(e), str(e)) from e
 
     def download(self, name, admin, timeout=10):
         """
@@ -648,25 +1080,25 @@ class Script:
         """
         try:
         # Click Download button
-            download_button = WebDriverWait(self.driver, 5).until(
+            download_button = self.tracer.wait(self.driver, 5).until(
                 EC.visibility_of_element_located((By.XPATH, "//button[contains(text(), 'Download')]"))
             )
             download_button.click()
-            time.sleep(2)  # Wait for modal
 
-            # Rename file
-            input_field = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 
+            # Rename file once the modal's input is visible
+            input_field = self.tracer.wait(self.driver, 10).until(
+                EC.visibility_of_element_located((By.CSS_SELECTOR, 
                     "input.MuiInputBase-input.MuiOutlinedInput-input.MuiInputBase-inputSizeSmall"))
             )
             input_field.send_keys(Keys.CONTROL + "a")
             input_field.send_keys(Keys.DELETE)
-            date = ', '.join(admin)
-            input_field.send_keys(f'{name}_{date}')
+            # Short name derived from the query, the store renames it by fingerprint later
+            self.download_name = query_fingerprint(self.options)
+            input_field.send_keys(self.download_name)
 
             try:
                 # Wait for and locate the outer div
-                outer_div = WebDriverWait(self.driver, timeout).until(
+                outer_div = self.tracer.wait(self.driver, timeout).until(
                     EC.presence_of_element_located((
                         By.CSS_SELECTOR,
                         'div.MuiInputBase-root.MuiOutlinedInput-root.MuiInputBase-colorPrimary.MuiInputBase-sizeSmall.css-1gnoy6z'
@@ -683,7 +1115,7 @@ class Script:
                 # Wait for dropdown menu to appear and select CSV option
                 # Try multiple possible selectors for the CSV option
                 try:
-                    csv_option = WebDriverWait(self.driver, 5).until(
+                    csv_option = self.tracer.wait(self.driver, 5).until(
                         EC.presence_of_element_located((
                             By.XPATH,
                             "//li[contains(@class, 'MuiMenuItem-root') and contains(text(), 'CSV')]"
@@ -691,7 +1123,7 @@ class Script:
                     )
                 except TimeoutException:
                     # Alternative approach using value attribute
-                    csv_option = WebDriverWait(self.driver, 5).until(
+                    csv_option = self.tracer.wait(self.driver, 5).until(
                         EC.presence_of_element_located((
                             By.CSS_SELECTOR,
                             "li[data-value='csv']"
@@ -702,7 +1134,7 @@ class Script:
                 csv_option.click()
                 
                 # Wait for and click the download button
-                download_button = WebDriverWait(self.driver, timeout).until(
+                download_button = self.tracer.wait(self.driver, timeout).until(
                     EC.element_to_be_clickable((
                         By.CSS_SELECTOR,
                         "button.MuiButtonBase-root.MuiButton-root.MuiButton-contained.MuiButton-containedPrimary.MuiButton-sizeSmall.MuiButton-containedSizeSmall.MuiRequestButton.MuiRequestButton-root.css-1emsfic"
@@ -718,57 +1150,143 @@ class Script:
                 
             except TimeoutException as e:
                 print(f"Timeout waiting for element: {str(e)}")
-                return False
+                raise PhaseError('download', TRANSIENT, "timed out in the download modal") from e
             except ElementClickInterceptedException as e:
                 print(f"Element click intercepted: {str(e)}")
-                return False
+                raise PhaseError('download', TRANSIENT, "click intercepted in the download modal") from e
             except Exception as e:
                 print(f"An error occurred: {str(e)}")
-                return False
+                raise PhaseError('download', SELECTOR_BROKEN, str(e)) from e
 
+        except PhaseError:
+            raise
         except Exception as e:
             print(f"Error downloading file: {e}")
+            raise PhaseError('download', classify(e), str(e)) from e
 
-def run_queries(queries: List[Dict], num_threads: int = 3):
+def run_queries(queries: List[Dict], num_threads: int = 3, max_tasks_per_browser: int = 25,
+                resume_mode: str = 'resume', backend: str = 'selenium', browser_profile: str = 'debug',
+                trace_dir: str = None, max_attempts: int = 3, min_split: int = 5,
+                adaptive: bool = False, min_threads: int = 1, max_threads: int = None,
+                capture: bool = False, on_capture=None, on_stored=None):
         
         """
         Download multiple reports concurrently.
         
         Args:
             queries (List[Dict]): List of queries to process
-            num_threads (int): Number of concurrent download threads
+            num_threads (int): Number of concurrent download threads, the starting point when adaptive
+            max_tasks_per_browser (int): Queries a browser serves before it is recycled
+            resume_mode (str): 'resume' skips queries the manifest lists as done, 'only-failed'
+                reruns only failed ones, 'force' reruns everything
+            backend (str): 'selenium' drives Chrome, 'http' calls the portal's API directly and
+                falls back to Chrome for queries it cannot download
+            browser_profile (str): Name of the BROWSER_PROFILES entry browsers are launched with
+            trace_dir (str, optional): Directory for per-query Chrome trace files and summary.json
+            max_attempts (int): Attempts per query when failures are transient
+            min_split (int): Smallest district chunk an idle worker may split off a queued query
+            adaptive (bool): Let a ConcurrencyController ramp the active threads up and down with
+                host memory, CPU load, page latency and error rate
+            min_threads (int): Fewest active threads when adaptive
+            max_threads (int, optional): Most active threads when adaptive, sized from the host by default
+            capture (bool): Take reports off Chrome's network events instead of its downloads
+            on_capture (Callable, optional): Called from the worker with each CapturedReport, so the
+                report can be processed from memory as soon as it arrives
+            on_stored (Callable, optional): Called from the worker with (query, path) for every stored report
+
+        Returns:
+            dict: Per-span timing summary, see TraceSummary.summary, plus the predicted and
+                actual makespan under 'makespan' and browser memory and restarts under 'browsers'.
         """
         # Create base download directory
         base_download_dir = os.path.join(os.getcwd(), 'downloads')
         os.makedirs(base_download_dir, exist_ok=True)
         
-        # Create task queue
-        task_queue = Queue()
+        # Skip queries a previous run already finished
+        manifest = Manifest(os.path.join(base_download_dir, 'manifest.jsonl'))
+        queries = manifest.pending(queries, resume_mode)
+        
+        # Longest queries first, costs estimated from their shape and earlier runs
+        model = CostModel(manifest.entries.values())
+        # Spare workers are kept, the queue splits large queries for them
+        num_threads = num_threads if queries else 0
+        task_queue = CostQueue(model, num_threads, min_split=min_split, manifest=manifest)
+        predicted = predict_makespan([model.estimate(q) for q in queries], num_threads)
+        
+        # Per-phase timings of every query, summarized at the end
+        summary = TraceSummary(trace_dir)
+        
+        # Start every thread the controller may need, those above its target stay parked
+        controller = None
+        if adaptive and queries:
+            def resize(target):
+                with task_queue.mutex:
+                    task_queue.workers = target
+            controller = ConcurrencyController(num_threads, min_threads, max_threads, summary=summary,
+                                               on_change=resize)
+            num_threads = controller.max_workers
+            resize(controller.target)
+        
+        # Browsers stay warm across queries, one per worker
+        pool = DriverPool(max_tasks=max_tasks_per_browser, profile=browser_profile, capture=capture)
+        
+        # One keep-alive session shared by all workers for the HTTP backend
+        session = None
+        if backend == 'http':
+            from HttpScript import create_session
+            session = create_session(pool_size=num_threads)
+        
+        # Transient failures are retried with backoff, everything ends up in the failure report
+        retry = RetryPolicy(max_attempts=max_attempts)
+        failures = FailureReport()
+        
+        # Queue everything before the workers start, so the first pick is the longest query
+        for query in queries:
+            task_queue.put(query)
         
         # Create and start worker threads
+        start = time.perf_counter()
         workers = []
-        for i in range(min(num_threads, len(queries))):
-            worker = DownloadWorker(task_queue, base_download_dir)
+        for i in range(num_threads):
+            worker = DownloadWorker(task_queue, base_download_dir, pool, manifest, session, summary,
+                                    retry, failures, controller, index=i, on_capture=on_capture,
+                                    on_stored=on_stored)
             worker.daemon = True
             worker.start()
             workers.append(worker)
+        if controller:
+            controller.begin()
         
-        # Add all queries to the task queue
-        for query in queries:
-            task_queue.put(query)
+        # Wait for all tasks to complete, including retries still backing off
+        task_queue.join()
+        actual = time.perf_counter() - start
+        if controller:
+            controller.stop()
         
         # Add poison pills to stop workers
         for _ in range(len(workers)):
             task_queue.put(None)
         
-        # Wait for all tasks to complete
-        task_queue.join()
-        
         # Wait for all threads to finish
         for worker in workers:
             worker.join()
+        
+        pool.close()
+        browsers = pool.report()
+        if session is not None:
+            session.close()
+        failures.report()
+        if controller:
+            controller.report()
+        print(f"\nMakespan: predicted {predicted:.0f}s, actual {actual:.0f}s "
+              f"({task_queue.splits} queries split for idle workers)")
+        result = summary.report()
+        result['makespan'] = {'predicted': round(predicted, 3), 'actual': round(actual, 3)}
+        result['browsers'] = browsers
+        return result
 
 import csv
+import argparse
 def load_queries():
     """
     Function that reads an input csv file and loads a querie.
@@ -785,8 +1303,9 @@ def load_queries():
         # Get the header row
         header = next(csv_reader)
 
-        # Loop through the rows
-        for row in csv_reader:
+        # Loop through the rows, line numbers count the header as line 1
+        for line, row in enumerate(csv_reader, start=2):
+            row += [''] * (8 - len(row))  # Trailing empty cells may be left out
             district = row[0].split(';') if row[0] else []
             if not district:
                 continue
@@ -809,7 +1328,8 @@ def load_queries():
                 'subject': subject,
                 'grade': grade,
                 'version': version,
-                'cluster': cluster
+                'cluster': cluster,
+                'line': line
             }
 
             # Append the query
@@ -818,10 +1338,89 @@ def load_queries():
 
         return queries
 
-from Processing import processing
+from Processing import processing, ProcessingPipeline, CSV_ENGINES
+from Outputs import OUTPUT_FORMATS
+from Planner import plan_queries
 
 if __name__ == "__main__":
-    queries = load_queries()
-    run_queries(queries, 3)
+    parser = argparse.ArgumentParser(description="Download STAAR reports listed in my3.csv")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--force', action='store_const', const='force', dest='resume_mode',
+                      help="Rerun every query, ignoring the manifest")
+    mode.add_argument('--only-failed', action='store_const', const='only-failed', dest='resume_mode',
+                      help="Rerun only queries the manifest lists as failed")
+    parser.set_defaults(resume_mode='resume')
+    parser.add_argument('--threads', type=int, default=3,
+                        help="Concurrent browser sessions, the starting point with --adaptive")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Ramp threads up and down with host memory, CPU load, page latency and errors")
+    parser.add_argument('--max-threads', type=int, default=None,
+                        help="Upper bound for --adaptive, sized from cores and free memory by default")
+    parser.add_argument('--capture', action='store_true',
+                        help="Take reports off the browser's network events instead of its download folder")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Process each report as it arrives instead of after the whole scrape")
+    parser.add_argument('--processing-workers', type=int, default=1,
+                        help="Processes parsing downloaded reports in parallel after the scrape")
+    parser.add_argument('--engine', choices=sorted(CSV_ENGINES), default='pandas',
+                        help="CSV parser for downloaded reports, pyarrow falls back to pandas when not installed")
+    parser.add_argument('--output-format', action='append', choices=OUTPUT_FORMATS,
+                        dest='formats', help="Output format, repeat for several, defaults to csv")
+    parser.add_argument('--partition-by-organization', action='store_true',
+                        help="Also partition Parquet and Feather outputs by Organization")
+    parser.add_argument('--layout', choices=['wide', 'tidy'], default='wide',
+                        help="Math and reading outputs, or one long table per subject in clean/tidy")
+    parser.add_argument('--database', default=None,
+                        help="Also upsert the results into this SQLite/DuckDB file, e.g. downloads/clean/results.db")
+    parser.add_argument('--chunk-size', type=int, default=20,
+                        help="Maximum number of districts selected in one browser session")
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium',
+                        help="Drive Chrome, or call the portal's API with Chrome as fallback")
+    parser.add_argument('--profile', choices=sorted(BROWSER_PROFILES), default='debug',
+                        help="Browser profile, 'fast' runs headless with images and animations off")
+    parser.add_argument('--runner', choices=['threads', 'async'], default='threads',
+                        help="Worker threads, or the asyncio scheduler with rate limiting and timeouts")
+    parser.add_argument('--deadline', type=float, default=None,
+                        help="Seconds the async runner may take before remaining queries are cancelled")
+    parser.add_argument('--strict', action='store_true',
+                        help="Also skip rows the catalog only flags with warnings")
+    parser.add_argument('--trace', action='store_true',
+                        help="Write per-query Chrome trace files and a timing summary to downloads/traces")
+    args = parser.parse_args()
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+
+    # Reject rows that cannot succeed before any browser starts
+    queries = validate_queries(load_queries(), strict=args.strict)
+    queries = plan_queries(queries, chunk_size=args.chunk_size)
+    trace_dir = os.path.join('downloads', 'traces') if args.trace else None
+
+    # In pipeline mode reports are cleaned while the scrape runs, straight from memory when captured
+    pipeline = None
+    if args.pipeline:
+        os.makedirs('downloads', exist_ok=True)
+        pipeline = ProcessingPipeline('downloads', engine=CSV_ENGINES[args.engine],
+                                      formats=tuple(args.formats or ['csv']),
+                                      by_organization=args.partition_by_organization, layout=args.layout,
+                                      database=args.database)
+        pipeline.start()
+    on_capture = pipeline.submit_capture if pipeline and args.capture else None
+    on_stored = pipeline.submit_path if pipeline and not args.capture else None
+
+    if args.runner == 'async':
+        from AsyncRunner import run_queries_async
+        run_queries_async(queries, args.threads, resume_mode=args.resume_mode, backend=args.backend,
+                          browser_profile=args.profile, deadline=args.deadline, trace_dir=trace_dir,
+                          capture=args.capture, postprocess=pipeline.submit_path if pipeline else None)
+    else:
+        run_queries(queries, args.threads, resume_mode=args.resume_mode, backend=args.backend,
+                    browser_profile=args.profile, trace_dir=trace_dir, adaptive=args.adaptive,
+                    max_threads=args.max_threads, capture=args.capture, on_capture=on_capture,
+                    on_stored=on_stored)
     # DATA CLEANING STARTING...
-    processing()
\ No newline at end of file
+    if pipeline:
+        pipeline.close()
+    else:
+        processing(engine=CSV_ENGINES[args.engine], workers=args.processing_workers, formats=tuple(args.formats or ['csv']),
+                   by_organization=args.partition_by_organization, layout=args.layout,
+                   database=args.database)
\ No newline at end of file
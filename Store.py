@@ -0,0 +1,193 @@
+import os
+import sqlite3
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None  # Results are stored in SQLite without duckdb
+
+# Columns identifying a row of the math and reading outputs, each gets an index
+KEY_COLUMNS = ['Organization', 'ID/CDC', 'Administration', 'Tested Grade', 'Student Group']
+
+# Key of each table, the tidy table has one row per metric
+TABLE_KEYS = {
+    'math': KEY_COLUMNS,
+    'reading': KEY_COLUMNS,
+    'tidy': KEY_COLUMNS + ['test', 'subject', 'metric']
+}
+
+# query() arguments and the columns they filter on
+FILTERS = {'organization': 'Organization', 'cdc': 'ID/CDC', 'administration': 'Administration',
+           'grade': 'Tested Grade', 'group': 'Student Group', 'test': 'test', 'subject': 'subject',
+           'metric': 'metric'}
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def pick_backend(path):
+    """
+    Returns 'duckdb' when duckdb is installed, unless path already holds a SQLite database.
+    """
+    if duckdb is None:
+        return 'sqlite'
+    if os.path.exists(path):
+        with open(path, 'rb') as file:
+            if file.read(16) == b'SQLite format 3\x00':
+                return 'sqlite'
+    return 'duckdb'
+
+class ResultsStore:
+    def __init__(self, path: str, backend: str = None):
+        """
+        Embedded database of the processed results, for lookups without reading the outputs.
+
+        Every table has a primary key on its TABLE_KEYS and an index on each of them, so
+        loading the same results again updates the rows instead of duplicating them.
+        A missing Tested Grade (EOC reports) is stored as '' so it takes part in the key.
+
+        Args:
+            path (str): Database file, created when missing
+            backend (str, optional): 'sqlite' or 'duckdb', see pick_backend when not given
+        """
+        self.path = path
+        self.backend = backend or pick_backend(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if self.backend == 'duckdb':
+            if duckdb is None:
+                raise ImportError("duckdb is not installed")
+            self.conn = duckdb.connect(path)
+        else:
+            self.conn = sqlite3.connect(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def tables(self):
+        """
+        Returns the names of the tables holding results.
+        """
+        if self.backend == 'duckdb':
+            rows = self.conn.execute("SELECT table_name FROM information_schema.tables").fetchall()
+        else:
+            rows = self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+        return sorted(row[0] for row in rows)
+
+    def _create(self, table, df, keys):
+        columns = []
+        for column in df.columns:
+            if column in keys:
+                kind = 'TEXT'
+            elif pd.api.types.is_integer_dtype(df[column]):
+                kind = 'BIGINT'
+            elif pd.api.types.is_numeric_dtype(df[column]):
+                kind = 'DOUBLE'
+            else:
+                kind = 'TEXT'
+            columns.append(f"{_quote(column)} {kind}")
+        primary = ', '.join(_quote(k) for k in keys)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} ({', '.join(columns)}, PRIMARY KEY ({primary}))")
+        # The primary key covers lookups by Organization, every other column query() filters on gets an index
+        for key in [column for column in FILTERS.values() if column in keys and column != keys[0]]:
+            index = _quote(f"{table}_{key}")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {_quote(table)} ({_quote(key)})")
+
+    def upsert(self, table, df):
+        """
+        Inserts a frame's rows, replacing the values of rows whose key is already stored.
+
+        Args:
+            table (str): 'math', 'reading' or 'tidy', see TABLE_KEYS
+            df (pd.DataFrame): Rows with the table's key columns
+
+        Returns:
+            int: Number of rows loaded.
+        """
+        keys = [k for k in TABLE_KEYS[table] if k in df.columns or k == 'Tested Grade']
+        df = df.copy()
+        for key in keys:
+            df[key] = df[key].astype('string').fillna('') if key in df.columns else ''
+        # A key loaded twice in one statement is an error, the last report wins as in the outputs
+        df = df.drop_duplicates(subset=keys, keep='last')
+        self._create(table, df, keys)
+
+        names = ', '.join(_quote(c) for c in df.columns)
+        values = [c for c in df.columns if c not in keys]
+        action = ('DO UPDATE SET ' + ', '.join(f"{_quote(c)} = excluded.{_quote(c)}" for c in values)
+                  if values else 'DO NOTHING')
+        conflict = f"ON CONFLICT ({', '.join(_quote(k) for k in keys)}) {action}"
+
+        if self.backend == 'duckdb':
+            self.conn.register('batch', df)
+            try:
+                self.conn.execute(f"INSERT INTO {_quote(table)} ({names}) SELECT {names} FROM batch {conflict}")
+            finally:
+                self.conn.unregister('batch')
+        else:
+            marks = ', '.join('?' for _ in df.columns)
+            rows = (tuple(None if pd.isna(v) else v.item() if hasattr(v, 'item') else v for v in row)
+                    for row in df.astype(object).itertuples(index=False, name=None))
+            with self.conn:
+                self.conn.executemany(f"INSERT INTO {_quote(table)} ({names}) VALUES ({marks}) {conflict}", rows)
+        return len(df)
+
+    def load(self, frames):
+        """
+        Upserts several tables and prints what was loaded.
+
+        Args:
+            frames (dict): {table: DataFrame}, tables without a frame are skipped
+        """
+        for table, df in frames.items():
+            if df is None or df.empty:
+                continue
+            rows = self.upsert(table, df)
+            print(f"Loaded {rows} {table} rows into {self.path} ({self.backend})")
+
+    def query(self, table='math', columns=None, **filters):
+        """
+        Returns the rows of a table matching the filters, read through the indexes.
+
+        Args:
+            table (str): Table to read
+            columns (list[str], optional): Columns to return, all when not given
+            **filters: Any of organization, cdc, administration, grade and group, and test,
+                subject and metric on the tidy table, each a value or a list of values.
+                Filters left as None match everything.
+
+        Returns:
+            pd.DataFrame: The matching rows, a missing Tested Grade as NA.
+        """
+        clauses, params = [], []
+        for name, value in filters.items():
+            if name not in FILTERS:
+                raise TypeError(f"unknown filter '{name}', expected one of {sorted(FILTERS)}")
+            if value is None:
+                continue
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f"{_quote(FILTERS[name])} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+
+        select = ', '.join(_quote(c) for c in columns) if columns else '*'
+        sql = f"SELECT {select} FROM {_quote(table)}"
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        cursor = self.conn.execute(sql, params)
+        df = pd.DataFrame(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+        for key in TABLE_KEYS.get(table, KEY_COLUMNS):
+            if key in df.columns:
+                df[key] = df[key].astype('string').replace('', pd.NA)
+        return df
+
+def query(path, table='math', columns=None, **filters):
+    """
+    Opens the results database at path and returns ResultsStore.query(table, columns, **filters).
+    """
+    with ResultsStore(path) as store:
+        return store.query(table, columns, **filters)
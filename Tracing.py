@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from selenium.webdriver.support.ui import WebDriverWait
+
+class TracedWait(WebDriverWait):
+    """
+    WebDriverWait that records how long each until() call blocks.
+    """
+    def __init__(self, tracer, driver, timeout, **kwargs):
+        super().__init__(driver, timeout, **kwargs)
+        self.tracer = tracer
+
+    def until(self, method, message=""):
+        with self.tracer.span(getattr(method, '__name__', type(method).__name__), 'wait'):
+            return super().until(method, message)
+
+class Tracer:
+    def __init__(self, name: str):
+        """
+        Records timed spans for one query at the cost of a perf_counter call and a list append.
+
+        Spans have a category: 'phase' for the steps of Script.run, 'step' for sub-steps such
+        as a district search, 'sleep' for explicit sleeps and 'wait' for WebDriverWait.
+
+        Args:
+            name (str): Name of the traced query, usually its fingerprint
+        """
+        self.name = name
+        self.origin = time.perf_counter()
+        self.events = []  # (name, category, start, duration, thread id, args)
+
+    @contextmanager
+    def span(self, name, category='phase', **args):
+        """
+        Times the body of a with block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.events.append((name, category, start, time.perf_counter() - start,
+                                threading.get_ident(), args))
+
+    def sleep(self, seconds):
+        """
+        time.sleep that is counted towards the query's sleep time.
+        """
+        with self.span('sleep', 'sleep', seconds=seconds):
+            time.sleep(seconds)
+
+    def wait(self, driver, timeout, **kwargs):
+        """
+        Returns a WebDriverWait whose blocking time is counted towards the query's wait time.
+        """
+        return TracedWait(self, driver, timeout, **kwargs)
+
+    def totals(self, category):
+        """
+        Returns the summed duration per span name for one category.
+        """
+        totals = {}
+        for name, cat, _, duration, _, _ in self.events:
+            if cat == category:
+                totals[name] = totals.get(name, 0.0) + duration
+        return totals
+
+    def export(self, path):
+        """
+        Writes the spans as Chrome trace-event JSON, viewable in chrome://tracing or Perfetto.
+        """
+        events = [{
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((start - self.origin) * 1e6),
+            'dur': round(duration * 1e6),
+            'pid': os.getpid(),
+            'tid': tid,
+            'args': {k: str(v) for k, v in args.items()}
+        } for name, category, start, duration, tid, args in self.events]
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': events, 'otherData': {'query': self.name}}, file)
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class TraceSummary:
+    def __init__(self, trace_dir: str = None):
+        """
+        Collects the tracers of a run and summarizes them.
+
+        Args:
+            trace_dir (str, optional): Directory per-query traces are exported to, no export when omitted
+        """
+        self.trace_dir = trace_dir
+        self.lock = threading.Lock()
+        self.samples = {}  # "category:name" -> per-query durations
+
+    def add(self, tracer: Tracer):
+        """
+        Adds a finished query's spans, exporting its trace when a trace directory is set.
+        """
+        if self.trace_dir:
+            tracer.export(os.path.join(self.trace_dir, f"{tracer.name}.json"))
+        with self.lock:
+            for category in ('phase', 'step', 'sleep', 'wait'):
+                for name, total in tracer.totals(category).items():
+                    self.samples.setdefault(f"{category}:{name}", []).append(total)
+
+    def summary(self):
+        """
+        Returns count, p50, p95 and total seconds per span, per query.
+        """
+        return {key: {'count': len(values),
+                      'p50': round(_percentile(values, 50), 3),
+                      'p95': round(_percentile(values, 95), 3),
+                      'total': round(sum(values), 3)}
+                for key, values in sorted(self.samples.items())}
+
+    def report(self):
+        """
+        Prints the summary and writes it to summary.json in the trace directory.
+        """
+        summary = self.summary()
+        if not summary:
+            return summary
+        print("\nTiming summary (seconds per query)")
+        print(f"  {'span':<40} {'count':>5} {'p50':>8} {'p95':>8} {'total':>9}")
+        for key, s in summary.items():
+            print(f"  {key:<40} {s['count']:>5} {s['p50']:>8.2f} {s['p95']:>8.2f} {s['total']:>9.1f}")
+
+        if self.trace_dir:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            with open(os.path.join(self.trace_dir, 'summary.json'), 'w', encoding='utf-8') as file:
+                json.dump(summary, file, indent=2)
+        return summary
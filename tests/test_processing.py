@@ -0,0 +1,45 @@
+import io
+
+import pytest
+
+from MockPortal import synthetic_report_csv
+from Processing import SNIFF_BYTES, pyarrow, read_report
+
+ENGINES = ['c'] + (['pyarrow'] if pyarrow is not None else [])
+
+def report_bytes(organizations):
+    """
+    A synthetic report, UTF-8 encoded.
+    """
+    return synthetic_report_csv(organizations).encode('utf-8')
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_latin1_after_sniffed_prefix(engine):
+    organizations = [f'{i:06d}' for i in range(2000)]
+    data = report_bytes(organizations)
+    assert len(data) > SNIFF_BYTES
+    # A single latin1 byte well past the prefix the encoding is sniffed from
+    data = data.replace('District 001999'.encode('utf-8'), 'Distrit\xe9 001999'.encode('latin1'))
+
+    df, stats = read_report(io.BytesIO(data), 'latin1.csv', engine)
+    assert df is not None
+    assert 'Distrit\xe9 001999' in set(df['Organization'])
+    assert len(df) == len(organizations) * 5
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_zero_padded_ids_are_kept(engine):
+    df, stats = read_report(io.BytesIO(report_bytes(['001907', '057905'])), 'ids.csv', engine)
+    assert list(df['ID/CDC'].unique()) == ['001907', '057905']
+    assert str(df['ID/CDC'].dtype) == 'string'
+    assert str(df['STAAR - Mathematics|Tests Taken'].dtype) == 'Int64'
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_suppressed_counts_fall_back_to_text(engine):
+    text = synthetic_report_csv(['001907'])
+    lines = text.splitlines()
+    cells = lines[1].split(',')
+    cells[5] = '*'
+    lines[1] = ','.join(cells)
+    df, stats = read_report(io.BytesIO('\n'.join(lines).encode('utf-8')), 'suppressed.csv', engine)
+    assert df['STAAR - Mathematics|Tests Taken'].iloc[0] == '*'
+    assert df['ID/CDC'].iloc[0] == '001907'
@@ -0,0 +1,61 @@
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+from Failures import BAD_INPUT, TRANSIENT, PhaseError
+from Script import Script
+from Tracing import Tracer
+
+class FakeDriver:
+    """
+    Answers the bulk search script with prepared results.
+    """
+    def __init__(self, results):
+        self.results = results
+        self.timeouts = type('Timeouts', (), {'script': 30})()
+        self.current_url = 'about:blank'
+
+    def set_script_timeout(self, seconds):
+        self.timeouts.script = seconds
+
+    def execute_async_script(self, script, *args):
+        return [dict(r) for r in self.results]
+
+def make_script(results, search_error=None):
+    script = Script.__new__(Script)
+    script.options = {}
+    script.driver = FakeDriver(results)
+    script.tracer = Tracer('test')
+    def search(dis):
+        raise search_error
+    script._search = search
+    return script
+
+def result(district, ok, no_match=False, error=None):
+    return {'district': district, 'ok': ok, 'ms': 10, 'error': error, 'noMatch': no_match}
+
+def test_no_match_is_bad_input():
+    script = make_script([result('001907', True), result('999999', False, no_match=True, error='no results')],
+                         search_error=AssertionError("a district without results must not be searched again"))
+    with pytest.raises(PhaseError) as raised:
+        script.select_district(['001907', '999999'])
+    assert raised.value.kind == BAD_INPUT
+    assert '999999' in str(raised.value)
+
+def test_timeout_is_transient():
+    script = make_script([result('001907', False, error='Error: timed out')],
+                         search_error=TimeoutException('results table'))
+    with pytest.raises(PhaseError) as raised:
+        script.select_district(['001907'])
+    assert raised.value.kind == TRANSIENT
+
+def test_sequential_no_match_is_bad_input():
+    script = make_script([result('001907', False, error='Error: timed out')],
+                         search_error=PhaseError('select_district', BAD_INPUT, "no match for '001907'"))
+    with pytest.raises(PhaseError) as raised:
+        script.select_district(['001907'])
+    assert raised.value.kind == BAD_INPUT
+
+def test_bulk_search_restores_script_timeout():
+    script = make_script([result('001907', True)])
+    script.select_district(['001907'])
+    assert script.driver.timeouts.script == 30